@@ -0,0 +1,56 @@
+"""
+Time parsing a large cloudformation yaml template
+
+Usage::
+
+    python benchmarks/cloudformation_yaml.py [number_of_resources]
+
+We compare the pure python CloudformationYamlLoader, the libyaml backed
+FastCloudformationYamlLoader and bespin.amazon.cloudformation_yaml.load, which
+only parses the same template once.
+"""
+from bespin.amazon.cloudformation_yaml import CloudformationYamlLoader, FastCloudformationYamlLoader, FastLoader, load
+
+import yaml
+import time
+import sys
+
+def make(num_resources):
+    lines = ["Resources:"]
+    for i in range(num_resources):
+        lines.extend([
+              "  Queue{0}:".format(i)
+            , "    Type: AWS::SQS::Queue"
+            , "    Properties:"
+            , "      QueueName: !Sub \"${{AWS::StackName}}-queue-{0}\"".format(i)
+            , "      VisibilityTimeout: 60"
+            , "      Tags:"
+            , "        - Key: Name"
+            , "          Value: !Join [\"-\", [!Ref \"AWS::StackName\", \"{0}\"]]".format(i)
+            ])
+    lines.append("Outputs:")
+    for i in range(num_resources):
+        lines.extend([
+              "  Queue{0}Arn:".format(i)
+            , "    Value: !GetAtt Queue{0}.Arn".format(i)
+            ])
+    return "\n".join(lines) + "\n"
+
+def timed(name, func, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        result = func()
+    print("{0:<40}{1:.3f}s".format(name, (time.time() - start) / repeat))
+    return result
+
+if __name__ == "__main__":
+    num_resources = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    text = make(num_resources)
+    print("{0} resources, {1:.1f}MB, using {2}".format(num_resources, len(text) / 1024.0 / 1024.0, FastLoader.__name__))
+
+    slow = timed("CloudformationYamlLoader", lambda: yaml.load(text, Loader=CloudformationYamlLoader), 1)
+    fast = timed("FastCloudformationYamlLoader", lambda: yaml.load(text, Loader=FastCloudformationYamlLoader), 1)
+    timed("load (first)", lambda: load(text), 1)
+    cached = timed("load (again)", lambda: load(text), 10)
+
+    assert slow == fast == cached
@@ -0,0 +1,75 @@
+"""
+Time making a compressed tar artifact
+
+Usage::
+
+    python benchmarks/compression.py [size_in_mb] [threads]
+
+We make a folder of files with roughly size_in_mb of somewhat compressible
+data (64 by default) and time tarring it with the gz that tarfile gives us,
+gz compressed across threads (every cpu by default) and zstd if the
+zstandard package is installed. Then we time zipping 20000 small files with
+and without deflating them across threads.
+"""
+from bespin.option_spec.artifact_objs import ArtifactPath
+from bespin.compression import cpu_count
+from bespin import helpers as hp
+
+import tempfile
+import random
+import shutil
+import time
+import sys
+import os
+
+words = [("".join(random.choice("abcdefghijklmnop") for _ in range(random.randint(2, 10)))).encode("utf-8") for _ in range(5000)]
+
+def make(folder, num_files, file_size):
+    for i in range(num_files):
+        with open(os.path.join(folder, "file{0}".format(i)), "wb") as fle:
+            written = 0
+            while written < file_size:
+                chunk = b" ".join(random.choice(words) for _ in range(min(1000, file_size // 6 + 1))) + b"\n"
+                fle.write(chunk)
+                written += len(chunk)
+
+def timed(name, paths, **kwargs):
+    with hp.a_temp_file() as location:
+        start = time.time()
+        hp.generate_archive_file(location, paths, **kwargs)
+        took = time.time() - start
+        print("{0:<40}{1:.3f}s\t{2:.1f}MB".format(name, took, os.stat(location.name).st_size / 1024.0 / 1024.0))
+
+if __name__ == "__main__":
+    size_in_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else cpu_count()
+
+    folder = tempfile.mkdtemp()
+    try:
+        make(folder, size_in_mb, 1024 * 1024)
+        paths = [ArtifactPath(folder, "/app", stdout=open(os.devnull, "w"))]
+        print("{0}MB of files, {1} threads".format(size_in_mb, threads))
+
+        timed("tarfile gz", paths, compression="gz")
+        timed("gz level 6, 1 thread", paths, compression="gz", compression_level=6)
+        timed("gz level 6, {0} threads".format(threads), paths, compression="gz", compression_level=6, compression_threads=threads)
+
+        try:
+            import zstandard
+        except ImportError:
+            print("zstandard isn't installed, not timing zstd")
+        else:
+            timed("zstd level 3, {0} threads".format(threads), paths, compression="zstd", compression_threads=threads)
+    finally:
+        shutil.rmtree(folder)
+
+    folder = tempfile.mkdtemp()
+    try:
+        make(folder, 20000, 4096)
+        paths = [ArtifactPath(folder, "/app", stdout=open(os.devnull, "w"))]
+        print("20000 files of 4KB")
+
+        timed("zip", paths, archive_format="zip")
+        timed("zip, {0} threads".format(threads), paths, archive_format="zip", compression_threads=threads)
+    finally:
+        shutil.rmtree(folder)
@@ -0,0 +1,57 @@
+"""
+Time how long it takes bespin.layers.Layers to order synthetic graphs of stacks
+
+Usage::
+
+    python benchmarks/layers.py [number_of_stacks]
+
+Three shapes of graph are timed:
+
+wide
+    Every stack depends on up to three random stacks made before it
+
+deep
+    One long chain where every stack depends on the one before it
+
+fan
+    Every stack depends on the same handful of base stacks
+"""
+from bespin.layers import Layers
+
+import random
+import time
+import sys
+
+class FakeStack(object):
+    def __init__(self, dependencies):
+        self._dependencies = dependencies
+
+    def dependencies(self, stacks):
+        for dependency in self._dependencies:
+            yield dependency
+
+def wide(count, rand):
+    names = ["stack{0}".format(i) for i in range(count)]
+    return dict((name, FakeStack(rand.sample(names[:i], min(i, rand.randint(0, 3))))) for i, name in enumerate(names))
+
+def deep(count, rand):
+    return dict(("stack{0}".format(i), FakeStack(["stack{0}".format(i - 1)] if i else [])) for i in range(count))
+
+def fan(count, rand):
+    bases = ["base{0}".format(i) for i in range(5)]
+    stacks = dict((name, FakeStack([])) for name in bases)
+    stacks.update(("stack{0}".format(i), FakeStack(bases)) for i in range(count))
+    return stacks
+
+def main(count):
+    rand = random.Random(1)
+    for maker in (wide, deep, fan):
+        stacks = maker(count, rand)
+        start = time.time()
+        layers = Layers(stacks)
+        layers.add_all_to_layers()
+        took = time.time() - start
+        print("{0:<5} {1:>7} stacks {2:>6} layers {3:.3f}s".format(maker.__name__, len(stacks), len(layers.layered), took))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,78 @@
+"""
+Time replacing placeholders in a large params file
+
+Usage::
+
+    python benchmarks/params.py [number_of_params] [number_of_variables]
+
+The params refer to random variables, some of which refer to other variables,
+and we time bespin.substitution.Substitution against the loop of
+``str.replace`` over every variable that Stack.params_json_raw_vars_replaced
+used to do.
+"""
+from bespin.substitution import Substitution
+
+import random
+import json
+import time
+import sys
+import re
+
+def make(num_params, num_vars, rand):
+    names = ["VAR_{0}".format(i) for i in range(num_vars)]
+    values = {}
+    for i, name in enumerate(names):
+        if i and rand.random() < 0.2:
+            values[name] = "prefix-XXX_{0}_XXX".format(rand.choice(names[:i]))
+        else:
+            values[name] = "value-{0}".format(i)
+
+    params = [
+          {"ParameterKey": "Param{0}".format(i), "ParameterValue": "XXX_{0}_XXX".format(rand.choice(names))}
+          for i in range(num_params)
+        ]
+    return json.dumps(params), values
+
+def old_way(params, values, resolved):
+    def replace_vars(s):
+        for var, value in values.items():
+            key = "XXX_{0}_XXX".format(var)
+            if key in s:
+                resolved.append(var)
+                s = s.replace(key, value)
+        return s
+
+    varsre = re.compile("XXX_([A-Z0-9_]+)_XXX")
+    matches = lambda p: varsre.findall(p)
+    while varsre.search(params):
+        matches_before = matches(params)
+        params = replace_vars(params)
+        if matches_before == matches(params):
+            break
+    return params
+
+def new_way(params, values, resolved):
+    def getter(name):
+        def get():
+            resolved.append(name)
+            return values[name]
+        return get
+    return Substitution(dict((name, getter(name)) for name in values)).replace(params)
+
+def main(num_params, num_vars):
+    params, values = make(num_params, num_vars, random.Random(1))
+    results = []
+    for way in (old_way, new_way):
+        resolved = []
+        start = time.time()
+        result = way(params, values, resolved)
+        took = time.time() - start
+        results.append(result)
+        print("{0:<7} {1:>6} params {2:>5} vars {3:>6} resolves {4:.3f}s".format(way.__name__, num_params, num_vars, len(resolved), took))
+
+    if results[0] != results[1]:
+        print("The results are different!")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 500)
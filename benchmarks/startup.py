@@ -0,0 +1,72 @@
+"""
+Time how long bespin takes to get to the point of running a task
+
+Usage::
+
+    python benchmarks/startup.py [number_of_stacks ...]
+
+For each number of stacks (10, 100 and 1000 by default) we write a
+configuration where each stack has a task and most stacks depend on the stack
+before them through a variable, in chains of five. Then we time preparing the
+collector and converting the last stack and what it depends on, which is what
+``bespin deploy dev stack_999`` does before talking to amazon.
+"""
+from bespin.collector import Collector
+
+from textwrap import dedent
+import tempfile
+import shutil
+import json
+import time
+import sys
+import os
+
+def make(folder, num_stacks):
+    stacks = {}
+    for i in range(num_stacks):
+        stack = {
+              "stack_name": "stack-{0}".format(i)
+            , "stack_json": "{config_root}/stack.json"
+            , "params_yaml": {"One": "XXX_ONE_XXX"}
+            , "vars": {"one": "{{environment}}-{0}".format(i)}
+            , "tasks": {"show_{0}".format(i): {"action": "show"}}
+            }
+        if i % 5:
+            stack["vars"]["previous"] = ["stack_{0}".format(i - 1), "Output"]
+        stacks["stack_{0}".format(i)] = stack
+
+    config = {
+          "environments": {"dev": {"account_id": "123456789012", "region": "ap-southeast-2", "vars": {"region": "ap-southeast-2"}}}
+        , "stacks": stacks
+        }
+
+    location = os.path.join(folder, "bespin.yml")
+    with open(location, "w") as fle:
+        json.dump(config, fle)
+    with open(os.path.join(folder, "stack.json"), "w") as fle:
+        json.dump({"Resources": {}, "Outputs": {"Output": {"Value": "1"}}}, fle)
+    return location
+
+def startup(location, stack):
+    args_dict = {"bespin": {"environment": "dev", "chosen_stack": stack, "chosen_task": "deploy", "no_cache": True, "extra": ""}, "command": ""}
+    collector = Collector()
+    collector.home_dir_configuration_location = lambda: None
+    collector.prepare(location, args_dict)
+    configuration = collector.configuration
+    wanted = [stack]
+    while wanted:
+        stack = configuration["stacks"][wanted.pop()]
+        wanted.extend(stack.dependencies(configuration["stacks"]))
+    return collector
+
+if __name__ == "__main__":
+    counts = [int(num) for num in sys.argv[1:]] or [10, 100, 1000]
+    for num_stacks in counts:
+        folder = tempfile.mkdtemp()
+        try:
+            location = make(folder, num_stacks)
+            start = time.time()
+            startup(location, "stack_{0}".format(num_stacks - 1))
+            print("{0:>5} stacks\t{1:.3f}s".format(num_stacks, time.time() - start))
+        finally:
+            shutil.rmtree(folder)
@@ -4,15 +4,12 @@ The functionality itself for each task.
 Each task is specified with the ``an_action`` decorator
 """
 
-from bespin.errors import BespinError, BadOption, ProgrammerError
+from bespin.errors import BespinError, BadOption, BadStack, ProgrammerError
 from bespin.option_spec.bespin_specs import valid_password_key
 from bespin.option_spec.stack_specs import env_spec
-from bespin.amazon.credentials import Credentials
-from bespin.operations.downtimer import Downtimer
 from bespin.operations.deployer import Deployer
 from bespin.operations.builder import Builder
 from bespin.operations.plan import Plan
-from bespin.operations.ssh import SSH
 from bespin.layers import Layers
 from bespin import helpers as hp
 
@@ -26,6 +23,7 @@ import logging
 import base64
 import shlex
 import json
+import time
 import sys
 import os
 
@@ -102,8 +100,17 @@ def show(collector, **kwargs):
 
 @an_action(needs_stack=True, needs_credentials=True)
 def deploy(collector, stack, **kwargs):
-    """Deploy a particular stack"""
-    Deployer().deploy_stack(stack, collector.configuration["stacks"])
+    """
+    Deploy a particular stack
+
+    When combined with the ``--max-parallel`` option, the stack and it's
+    dependencies are deployed at the same time, with each stack starting as
+    soon as the stacks it needs are deployed.
+    """
+    bespin = collector.configuration["bespin"]
+    Deployer().deploy_stacks([stack], collector.configuration["stacks"]
+        , max_parallel=bespin.max_parallel, continue_on_error=bespin.continue_on_error
+        )
 
 @an_action(needs_stack=True, needs_credentials=True)
 def publish_artifacts(collector, stack, **kwargs):
@@ -143,11 +150,35 @@ def sanity_check(collector, stack, **kwargs):
 
 @an_action(needs_credentials=True)
 def validate_templates(collector, **kwargs):
-    """Validates all stack templates and parameters against CloudFormation"""
+    """
+    Validates all stack templates and parameters against CloudFormation
+
+    Use ``--max-parallel`` to validate that many stacks at the same time.
+    """
+    bespin = collector.configuration["bespin"]
     stacks = collector.configuration["stacks"]
-    for index, layer in enumerate(Builder().layered(stacks)):
-        for _, stack in layer:
-            stack.validate_template_params()
+    ordered = [stack for layer in Builder().layered(stacks) for _, stack in layer]
+    bespin.credentials.verify_creds()
+
+    timings = {}
+    def validate(stack):
+        def run():
+            start = time.time()
+            try:
+                stack.validate_template_params()
+            finally:
+                timings[stack.key_name] = time.time() - start
+        return run
+
+    results = hp.run_concurrently([(stack.key_name, validate(stack)) for stack in ordered], max_parallel=bespin.max_parallel)
+
+    width = max([len(name) for name in results] or [0])
+    for name, error in results.items():
+        print("{0}  {1:6.2f}s  {2}".format(name.ljust(width), timings[name], "ok" if error is None else "FAILED"))
+
+    failed = [name for name, error in results.items() if error is not None]
+    if failed:
+        raise BadStack("Some stacks failed validation", failed=failed, _errors=[results[name] for name in failed])
 
 @an_action(needs_stack=True, needs_credentials=True)
 def instances(collector, stack, artifact, **kwargs):
@@ -195,13 +226,13 @@ def tail(collector, stack, **kwargs):
 def params(collector, stack, **kwargs):
     """Print out the params"""
     stack.find_missing_env()
-    print(stack.stack_name)
-    print(json.dumps(stack.params_json_obj, indent=4))
+    print(stack.resolved.stack_name)
+    print(json.dumps(stack.resolved.params, indent=4))
 
 @an_action(needs_stack=True, needs_credentials=True)
 def outputs(collector, stack, artifact, **kwargs):
     """Print out the outputs"""
-    outputs = stack.cloudformation.outputs
+    outputs = stack.outputs
     if artifact not in (None, NotSpecified):
         if artifact not in outputs:
             raise BespinError("Couldn't find output", wanted=artifact, available=list(outputs.keys()))
@@ -213,13 +244,13 @@ def outputs(collector, stack, artifact, **kwargs):
 def deploy_plan(collector, stack, artifact, **kwargs):
     """Deploy a predefined list of stacks in order"""
     plan = artifact if artifact else stack
-    made = []
-    checked = []
-    deployer = Deployer()
+    bespin = collector.configuration["bespin"]
 
     stacks = collector.configuration["stacks"]
-    for stack in Plan.find_stacks(collector.configuration, stacks, plan):
-        deployer.deploy_stack(stacks[stack], stacks, made=made, checked=checked)
+    wanted = [stacks[stack] for stack in Plan.find_stacks(collector.configuration, stacks, plan)]
+    Deployer().deploy_stacks(wanted, stacks
+        , max_parallel=bespin.max_parallel, continue_on_error=bespin.continue_on_error
+        )
 
 @an_action(needs_credentials=True)
 def sanity_check_plan(collector, stack, artifact, **kwargs):
@@ -260,6 +291,7 @@ def command_on_instances(collector, stack, artifact, **kwargs):
     if proxy:
         extra_kwargs = {"proxy": stack.ssh.bastion, "proxy_ssh_key": bastion_key_path, "proxy_ssh_user": stack.ssh.user}
 
+    from bespin.operations.ssh import SSH
     SSH(ips, command, stack.ssh.user, instance_key_path, **extra_kwargs).run()
 
 @an_action(needs_stack=True, needs_credentials=True, needs_artifact=True)
@@ -317,6 +349,7 @@ def become(collector, stack, artifact, **kwargs):
     else:
         role = stack
 
+    from bespin.amazon.credentials import Credentials
     credentials = Credentials(region, configuration["environments"][environment].account_id, role)
     credentials.verify_creds()
 
@@ -349,6 +382,7 @@ def downtime(collector, stack, method="downtime", **kwargs):
     comment = provided_env["COMMENT"]
     duration = provided_env["DURATION"]
 
+    from bespin.operations.downtimer import Downtimer
     downtimer = Downtimer(stack.downtimer_options, dry_run=collector.configuration["bespin"].dry_run)
     for system, options in stack.alerting_systems.items():
         downtimer.register_system(system, options)
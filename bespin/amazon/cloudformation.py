@@ -1,10 +1,14 @@
-from bespin.errors import StackDoesntExist, BadStack, Throttled
+from bespin.errors import StackDoesntExist, BadStack
 from bespin.amazon.mixin import AmazonMixin
 from bespin import helpers as hp
 
+from contextlib import contextmanager
 import botocore
 import boto3
+import itertools
+import threading
 import datetime
+import hashlib
 import logging
 import pytz
 import time
@@ -13,6 +17,9 @@ import os
 
 log = logging.getLogger("bespin.amazon.cloudformation")
 
+# boto3 sessions aren't safe to create from many threads at the same time
+session_lock = threading.Lock()
+
 class StatusMeta(object):
     def __new__(cls, name, bases, attrs):
         attrs["name"] = name
@@ -68,11 +75,119 @@ for kls in [Status] + Status.__subclasses__():
     locals()[kls.__name__] = with_meta
     Status.statuses[kls.__name__] = with_meta
 
+class StackSnapshot(AmazonMixin):
+    """
+    The descriptions of every stack in a region from one paginated describe_stacks
+
+    This is shared by the Cloudformation objects for a region so that looking
+    at the status and outputs of many stacks is one call to amazon every
+    ``ttl`` seconds rather than a call for each stack.
+
+    It's only worth listing every stack when many of them are being looked at,
+    so Cloudformation objects only use it inside ``shared()``.
+    """
+    service = "cloudformation"
+
+    def __init__(self, region="ap-southeast-2", ttl=5):
+        self.ttl = ttl
+        self.region = region
+        self.lock = threading.Lock()
+
+        self.stacks = {}
+        self.sharers = 0
+        self.missing = {}
+        self.generation = 0
+        self.refreshed = None
+        self.refreshed_generation = None
+
+    @hp.memoized_property
+    def conn(self):
+        log.info("Using region [%s] for cloudformation (all stacks)", self.region)
+        return self.session.client('cloudformation', region_name=self.region)
+
+    @hp.memoized_property
+    def session(self):
+        with session_lock:
+            return boto3.session.Session(region_name=self.region)
+
+    @property
+    def fresh(self):
+        if self.refreshed is None or self.refreshed_generation != self.generation:
+            return False
+        return time.time() - self.refreshed < self.ttl
+
+    @property
+    def in_use(self):
+        return self.sharers > 0
+
+    @contextmanager
+    def shared(self):
+        """Use the snapshot for descriptions while many stacks are being looked at"""
+        with self.lock:
+            self.sharers += 1
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.sharers -= 1
+
+    def invalidate(self):
+        """Make sure the next description comes from a new snapshot"""
+        self.generation += 1
+
+    def known_missing(self, stack_name):
+        """Say whether this stack wasn't in a snapshot since we were last invalidated"""
+        return self.missing.get(stack_name) == self.generation
+
+    def description(self, stack_name):
+        """Return the description of this stack or None if it isn't in the snapshot"""
+        with self.lock:
+            if not self.fresh:
+                self.refresh()
+            description = self.stacks.get(stack_name)
+            if description is None:
+                self.missing[stack_name] = self.generation
+            return description
+
+    def refresh(self):
+        started = time.time()
+        generation = self.generation
+
+        stacks = {}
+        kwargs = {}
+        while True:
+            response = self.throttled(self.conn.describe_stacks, **kwargs)
+            for description in response['Stacks']:
+                stacks[description['StackName']] = description
+
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+
+        log.debug("Found %s stacks in %s", len(stacks), self.region)
+        self.stacks = stacks
+        self.refreshed = started
+        self.refreshed_generation = generation
+
 ##BOTO3 TODO: refactor to use boto3 resources
 class Cloudformation(AmazonMixin):
-    def __init__(self, stack_name, region="ap-southeast-2"):
+    service = "cloudformation"
+
+    # How long we trust a cached validate_template response for
+    validation_max_age = 7 * 24 * 60 * 60
+
+    def __init__(self, stack_name, region="ap-southeast-2", snapshot=None, validation_cache=None):
         self.region = region
+        self.snapshot = snapshot
         self.stack_name = stack_name
+        self.validation_cache = validation_cache
+
+        # (EventId, Timestamp) of the newest event we've already seen
+        self.event_cursor = None
+
+        # {logical id: physical id} as of the stack's LastUpdatedTime
+        self._resources = None
+        self._resources_version = None
 
     @hp.memoized_property
     def conn(self):
@@ -81,24 +196,30 @@ class Cloudformation(AmazonMixin):
 
     @hp.memoized_property
     def session(self):
-        return boto3.session.Session(region_name=self.region)
+        with session_lock:
+            return boto3.session.Session(region_name=self.region)
 
     def reset(self):
         self._description = None
+        if self.snapshot is not None:
+            self.snapshot.invalidate()
 
     def description(self, force=False):
-        """Get the descriptions for the stack"""
+        """
+        Get the descriptions for the stack
+
+        This comes from the snapshot of all stacks while it's being shared, and
+        we ask for just this stack otherwise or if it isn't in the snapshot.
+        """
         if not getattr(self, "_description", None) or force:
+            if self.snapshot is not None and self.snapshot.in_use and not self.snapshot.known_missing(self.stack_name):
+                self._description = self.snapshot.description(self.stack_name)
+                if self._description is not None:
+                    return self._description
+
             with self.catch_boto_400(StackDoesntExist, "Couldn't find stack"):
-                while True:
-                    try:
-                        with self.ignore_throttling_error():
-                            response = self.conn.describe_stacks(StackName=self.stack_name)
-                            self._description = response['Stacks'][0]
-                            break
-                    except Throttled:
-                        log.info("Was throttled, waiting a bit")
-                        time.sleep(0.5)
+                response = self.throttled(self.conn.describe_stacks, StackName=self.stack_name)
+                self._description = response['Stacks'][0]
         return self._description
 
     @property
@@ -110,6 +231,11 @@ class Cloudformation(AmazonMixin):
         else:
             return {}
 
+    @property
+    def tags(self):
+        """Return the tags on the deployed stack as a dictionary"""
+        return dict((tag['Key'], tag['Value']) for tag in self.description().get('Tags', []))
+
     @property
     def status(self):
         force = False
@@ -128,9 +254,36 @@ class Cloudformation(AmazonMixin):
         except StackDoesntExist:
             return NONEXISTANT
 
+    def resources(self):
+        """
+        Return {logical id: physical id} for all the resources in the stack
+
+        We get these with a paginated list_stack_resources and only ask again
+        when the stack's LastUpdatedTime changes.
+        """
+        description = self.description()
+        version = description.get("LastUpdatedTime") or description.get("CreationTime")
+        if self._resources is None or self._resources_version != version:
+            resources = {}
+            kwargs = {"StackName": self.stack_name}
+            while True:
+                response = self.throttled(self.conn.list_stack_resources, **kwargs)
+                for summary in response['StackResourceSummaries']:
+                    resources[summary['LogicalResourceId']] = summary.get('PhysicalResourceId')
+
+                if not response.get('NextToken'):
+                    break
+                kwargs['NextToken'] = response['NextToken']
+
+            self._resources = resources
+            self._resources_version = version
+        return self._resources
+
     def map_logical_to_physical_resource_id(self, logical_id):
-        response = self.conn.describe_stack_resource(StackName=self.stack_name, LogicalResourceId=logical_id)
-        return response['StackResourceDetail']["PhysicalResourceId"]
+        resources = self.resources()
+        if resources.get(logical_id) is None:
+            raise BadStack("Couldn't find a physical id for resource", stack=self.stack_name, logical_id=logical_id, available=sorted(resources))
+        return resources[logical_id]
 
     def tags_from_dict(self, tags):
         """ helper to convert python dictionary into list of AWS Tag dicts """
@@ -154,7 +307,8 @@ class Cloudformation(AmazonMixin):
         if stack_tags: stack_args['Tags'] = stack_tags
         if policy: stack_args['StackPolicyBody'] = policy
         if role_arn: stack_args['RoleARN'] = role_arn
-        self.conn.create_stack(**stack_args)
+        self.throttled(self.conn.create_stack, **stack_args)
+        self.reset()
         return True
 
     def update(self, template_body, params, tags=None, policy=None, role_arn=None, termination_protection=False):
@@ -175,7 +329,8 @@ class Cloudformation(AmazonMixin):
 
         with self.catch_boto_400(BadStack, "Couldn't update the stack", stack_name=self.stack_name):
             try:
-                self.conn.update_stack(**stack_args)
+                self.throttled(self.conn.update_stack, **stack_args)
+                self.reset()
                 changed = True
             except botocore.exceptions.ClientError as error:
                 if error.response['Error']['Message'] == "No updates are to be performed.":
@@ -184,12 +339,13 @@ class Cloudformation(AmazonMixin):
                     raise
 
         with self.catch_boto_400(BadStack, "Couldn't update termination protection", stack_name=self.stack_name):
-            info = self.conn.describe_stacks(StackName=self.stack_name)
+            info = self.throttled(self.conn.describe_stacks, StackName=self.stack_name)
             if info["Stacks"] and "EnableTerminationProtection" in info["Stacks"][0]:
                 current = info["Stacks"][0]["EnableTerminationProtection"]
                 if current != termination_protection:
                     log.info("Changing termination protection (%s)\ttermination_protection=%s", self.stack_name, termination_protection)
-                    self.conn.update_termination_protection(StackName=self.stack_name, EnableTerminationProtection=termination_protection)
+                    self.throttled(self.conn.update_termination_protection, StackName=self.stack_name, EnableTerminationProtection=termination_protection)
+                    self.reset()
                     changed = True
             else:
                 log.error("Failed to figure out if the stack currently has termination protection (%s)", self.stack_name)
@@ -197,17 +353,69 @@ class Cloudformation(AmazonMixin):
         return changed
 
     def validate_template(self, filename):
-        with self.catch_boto_400(BadStack, "Amazon says no", stack_name=self.stack_name, filename=filename):
-            return self.conn.validate_template(TemplateBody=open(filename).read())
+        with open(filename) as fle:
+            return self.validate_template_body(fle.read())
+
+    def validate_template_body(self, template_body, revalidate=False):
+        """
+        Ask amazon if this template is valid and return what it says
+
+        Successful responses are kept in the validation cache, keyed by the
+        template and region, and are used instead of asking amazon again
+        unless ``revalidate`` is True.
+        """
+        key = hashlib.sha256("{0}\n{1}".format(self.region, template_body).encode("utf-8")).hexdigest()
+        if self.validation_cache is not None and not revalidate:
+            cached = self.validation_cache.get(key, max_age=self.validation_max_age)
+            if cached is not None:
+                log.debug("Template was already validated (%s)\tsha256=%s", self.stack_name, key)
+                return cached
+
+        with self.catch_boto_400(BadStack, "Amazon says no", stack_name=self.stack_name):
+            response = self.throttled(self.conn.validate_template, TemplateBody=template_body)
+
+        response.pop("ResponseMetadata", None)
+        if self.validation_cache is not None:
+            self.validation_cache.set(key, response)
+        return response
+
+    def new_events(self, since=None):
+        """
+        Return the events we haven't seen yet, oldest first
+
+        Amazon gives us events newest first, so we page through them until we
+        reach the newest event from last time. If we haven't seen any events
+        yet then we stop at events from before ``since``.
+        """
+        def seen(event):
+            if self.event_cursor is not None:
+                event_id, timestamp = self.event_cursor
+                return event['EventId'] == event_id or event['Timestamp'] < timestamp
+            return since is not None and event['Timestamp'] <= since
+
+        events = []
+        kwargs = {"StackName": self.stack_name}
+        while True:
+            response = self.throttled(self.conn.describe_stack_events, **kwargs)
+            page = response['StackEvents']
+            unseen = list(itertools.takewhile(lambda event: not seen(event), page))
+            events.extend(unseen)
+
+            if len(unseen) < len(page) or not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+
+        if events:
+            self.event_cursor = (events[0]['EventId'], events[0]['Timestamp'])
+        return list(reversed(events))
 
     ##BOTO3 TODO: can this be refactored with client.get_waiter?
-    ##BOTO3 TODO: also consider client.get_paginator('describe_stack_events')
     def wait(self, timeout=1200, rollback_is_failure=False, may_not_exist=True):
         status = self.status
         if not status.exists and may_not_exist:
             return status
 
-        last = datetime.datetime.now(pytz.utc)
+        started = datetime.datetime.now(pytz.utc)
         if status.failed:
             raise BadStack("Stack is in a failed state, it must be deleted first", name=self.stack_name, status=status)
 
@@ -221,25 +429,9 @@ class Cloudformation(AmazonMixin):
             else:
                 break
 
-            description = self.description()
-
-            events = []
-            while True:
-                try:
-                    with self.ignore_throttling_error():
-                        response = self.conn.describe_stack_events(StackName=self.stack_name)
-                        events = response['StackEvents']
-                        break
-                except Throttled:
-                    log.info("Was throttled, waiting a bit")
-                    time.sleep(1)
-
-            next_last = events[0]['Timestamp']
-            for event in events:
-                if event['Timestamp'] > last:
-                    reason = event.get('ResourceStatusReason', '')
-                    log.info("%s - %s %s (%s) %s", self.stack_name, event['ResourceType'], event['LogicalResourceId'], event['ResourceStatus'], reason)
-            last = next_last
+            for event in self.new_events(since=started):
+                reason = event.get('ResourceStatusReason', '')
+                log.info("%s - %s %s (%s) %s", self.stack_name, event['ResourceType'], event['LogicalResourceId'], event['ResourceStatus'], reason)
 
         status = self.status
         if status.failed or (rollback_is_failure and status.is_rollback) or not status.complete:
@@ -9,9 +9,11 @@ Licensed under the Apache License, Version 2.0 (the "License"). You may not use
 or in the "license" file accompanying this file. This file is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the License for the specific language governing permissions and limitations under the License.
 """
 
-import six
 import collections
+import threading
+import hashlib
 import yaml
+import six
 
 
 TAG_MAP = "tag:yaml.org,2002:map"
@@ -115,11 +117,21 @@ def representer(dumper, data):
 
 from yaml import Loader, Dumper, YAMLObject
 
+# Use libyaml when pyyaml was built with it
+try:
+    from yaml import CSafeLoader as FastLoader
+except ImportError:
+    from yaml import SafeLoader as FastLoader
+
 class CloudformationYamlLoader(Loader):
     pass
 
-CloudformationYamlLoader.add_constructor(TAG_MAP, construct_mapping)
-CloudformationYamlLoader.add_multi_constructor("!", multi_constructor)
+class FastCloudformationYamlLoader(FastLoader):
+    pass
+
+for loader in (CloudformationYamlLoader, FastCloudformationYamlLoader):
+    loader.add_constructor(TAG_MAP, construct_mapping)
+    loader.add_multi_constructor("!", multi_constructor)
 
 class CloudformationYamlDumper(Dumper):
     pass
@@ -127,3 +139,28 @@ class CloudformationYamlDumper(Dumper):
 CloudformationYamlDumper.add_representer(six.text_type, lambda dumper, value: dumper.represent_scalar(TAG_STRING, value))
 CloudformationYamlDumper.add_representer(collections.OrderedDict, representer)
 CloudformationYamlDumper.add_representer(dict, representer)
+
+# The last few templates we parsed, so each template is only parsed once
+parsed = collections.OrderedDict()
+parsed_lock = threading.Lock()
+max_parsed = 20
+
+def load(text):
+    """
+    Parse this cloudformation yaml with the FastCloudformationYamlLoader
+
+    The same text is only parsed once, so don't change what we return.
+    """
+    key = hashlib.sha1(text.encode("utf-8") if isinstance(text, six.text_type) else text).hexdigest()
+    with parsed_lock:
+        if key in parsed:
+            parsed[key] = parsed.pop(key)
+            return parsed[key]
+
+    template = yaml.load(text, Loader=FastCloudformationYamlLoader)
+
+    with parsed_lock:
+        parsed[key] = template
+        while len(parsed) > max_parsed:
+            parsed.popitem(last=False)
+    return template
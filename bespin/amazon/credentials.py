@@ -1,4 +1,4 @@
-from bespin.amazon.cloudformation import Cloudformation
+from bespin.amazon.cloudformation import Cloudformation, StackSnapshot
 from bespin.helpers import memoized_property
 from bespin.errors import BespinError, ProgrammerError
 from bespin.amazon.ec2 import EC2
@@ -8,6 +8,7 @@ from bespin.amazon.s3 import S3
 from bespin import VERSION
 
 from input_algorithms.spec_base import NotSpecified
+import threading
 import logging
 import botocore
 import boto3
@@ -17,37 +18,50 @@ import re
 log = logging.getLogger("bespin.amazon.credentials")
 
 class Credentials(object):
-    def __init__(self, region, account_id, assume_role):
+    # How long we use cached outputs for without asking amazon for them again
+    outputs_max_age = 60
+
+    def __init__(self, region, account_id, assume_role, outputs_cache=None, validation_cache=None, passwords_cache=None, fingerprints_cache=None):
         self.region = region
         self.account_id = account_id
         self.assume_role = assume_role
+        self.outputs_cache = outputs_cache
+        self.validation_cache = validation_cache
+        self.passwords_cache = passwords_cache
+        self.fingerprints_cache = fingerprints_cache
         self.session = None
         self.clouds = {}
+        self.clouds_lock = threading.Lock()
+        self.verify_lock = threading.Lock()
 
     def verify_creds(self):
         """Make sure our current credentials are for this account and set self.connection"""
         if getattr(self, "_verified", None):
             return
 
-        if self.assume_role is not NotSpecified:
-            self.assume()
-            self._verified = True
-            return
-
-        log.info("Verifying amazon credentials")
-        try:
-            self.session = boto3.session.Session(region_name=self.region)
-            amazon_account_id = self.session.client('sts').get_caller_identity().get('Account')
-            if int(self.account_id) != int(amazon_account_id):
-                raise BespinError("Please use credentials for the right account", expect=self.account_id, got=amazon_account_id)
-            self._verified = True
-        except botocore.exceptions.NoCredentialsError:
-            raise BespinError("Export AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY before running this script (your aws credentials)")
-        except botocore.exceptions.ClientError as error:
-            raise BespinError("Couldn't determine what account your credentials are from", error=error.message)
-
-        if self.session is None or self.session.region_name != self.region:
-            raise ProgrammerError("botocore.session created in incorrect region")
+        with self.verify_lock:
+            if getattr(self, "_verified", None):
+                return
+
+            if self.assume_role is not NotSpecified:
+                self.assume()
+                self._verified = True
+                return
+
+            log.info("Verifying amazon credentials")
+            try:
+                self.session = boto3.session.Session(region_name=self.region)
+                amazon_account_id = self.session.client('sts').get_caller_identity().get('Account')
+                if int(self.account_id) != int(amazon_account_id):
+                    raise BespinError("Please use credentials for the right account", expect=self.account_id, got=amazon_account_id)
+                self._verified = True
+            except botocore.exceptions.NoCredentialsError:
+                raise BespinError("Export AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY before running this script (your aws credentials)")
+            except botocore.exceptions.ClientError as error:
+                raise BespinError("Couldn't determine what account your credentials are from", error=error.message)
+
+            if self.session is None or self.session.region_name != self.region:
+                raise ProgrammerError("botocore.session created in incorrect region")
 
     def account_role_arn(self, role, partition='aws'):
         """Return full ARN for a role within the current account"""
@@ -111,7 +125,7 @@ class Credentials(object):
     @memoized_property
     def kms(self):
         self.verify_creds()
-        return KMS(self.region)
+        return KMS(self.region, account_id=self.account_id, assume_role=self.assume_role, decrypt_cache=self.passwords_cache)
 
     @memoized_property
     def iam(self):
@@ -121,7 +135,67 @@ class Credentials(object):
 
     def cloudformation(self, stack_name):
         self.verify_creds()
-        if stack_name not in self.clouds:
-            self.clouds[stack_name] = Cloudformation(stack_name, self.region)
-        return self.clouds[stack_name]
+        with self.clouds_lock:
+            if stack_name not in self.clouds:
+                self.clouds[stack_name] = Cloudformation(stack_name, self.region, snapshot=self.stack_snapshot, validation_cache=self.validation_cache)
+            return self.clouds[stack_name]
+
+    def outputs_key(self, stack_name):
+        return "{0}/{1}/{2}".format(self.account_id, self.region, stack_name)
+
+    def stack_outputs(self, stack_name):
+        """
+        Return the outputs of this stack
+
+        We use the outputs cache if it has outputs from the last
+        outputs_max_age seconds without talking to amazon at all. Otherwise we
+        wait for the stack, get the outputs from amazon and update the cache.
+        """
+        key = self.outputs_key(stack_name)
+
+        if self.outputs_cache is not None:
+            cached = self.outputs_cache.get(key, max_age=self.outputs_max_age)
+            if cached is not None:
+                log.debug("Using cached outputs (%s)", stack_name)
+                return cached["outputs"]
+
+        cloudformation = self.cloudformation(stack_name)
+        cloudformation.wait()
+        outputs = cloudformation.outputs
+
+        if self.outputs_cache is not None:
+            self.outputs_cache.set(key, {"outputs": outputs})
+
+        return outputs
+
+    def last_updated(self, cloudformation):
+        """Return when this stack was last changed as a string"""
+        description = cloudformation.description()
+        return str(description.get("LastUpdatedTime") or description.get("CreationTime"))
+
+    def forget_outputs(self, stack_name):
+        """Remove this stack from the outputs cache"""
+        if self.outputs_cache is not None:
+            self.outputs_cache.delete(self.outputs_key(stack_name))
+
+    def deployed_fingerprint(self, cloudformation):
+        """Return the fingerprint we remembered for this stack if it hasn't been changed since"""
+        if self.fingerprints_cache is None:
+            return None
+
+        cached = self.fingerprints_cache.get(self.outputs_key(cloudformation.stack_name))
+        if cached is not None and cached["last_updated"] == self.last_updated(cloudformation):
+            return cached["fingerprint"]
+
+    def remember_fingerprint(self, cloudformation, fingerprint):
+        """Remember the fingerprint of what we just deployed to this stack"""
+        if self.fingerprints_cache is not None:
+            value = {"last_updated": self.last_updated(cloudformation), "fingerprint": fingerprint}
+            self.fingerprints_cache.set(self.outputs_key(cloudformation.stack_name), value)
+
+    @memoized_property
+    def stack_snapshot(self):
+        """Descriptions of all the stacks in our region, shared by our Cloudformation objects"""
+        self.verify_creds()
+        return StackSnapshot(self.region)
 
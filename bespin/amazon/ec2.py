@@ -1,3 +1,5 @@
+from bespin.amazon.throttling import limiter
+from bespin.amazon.mixin import AmazonMixin
 from bespin.helpers import memoized_property
 
 import boto.ec2
@@ -9,7 +11,9 @@ import logging
 
 log = logging.getLogger("bespin.amazon.ec2")
 
-class EC2(object):
+class EC2(AmazonMixin):
+    service = "ec2"
+
     def __init__(self, region="ap-southeast-2"):
         self.region = region
 
@@ -22,36 +26,41 @@ class EC2(object):
     def autoscale(self):
         return boto.ec2.autoscale.connect_to_region(self.region)
 
+    def autoscale_throttled(self, func, *args, **kwargs):
+        """Like throttled but for calls to the autoscale connection"""
+        return limiter.call("autoscaling", self.region, func, *args, **kwargs)
+
+    def autoscaling_group(self, asg_physical_id):
+        return self.autoscale_throttled(self.autoscale.get_all_groups, names=[asg_physical_id])[0]
+
     def get_instances_in_asg_by_lifecycle_state(self, asg_physical_id, lifecycle_state=None):
         instances = []
 
-        asg = self.autoscale.get_all_groups(names=[asg_physical_id])
-        for instance in asg[0].instances:
+        for instance in self.autoscaling_group(asg_physical_id).instances:
             if lifecycle_state is None or lifecycle_state == instance.lifecycle_state:
                 instances.append(instance.instance_id)
 
         return instances
 
     def resume_processes(self, asg_physical_id):
-        self.autoscale.resume_processes(asg_physical_id, ["ScheduledActions"])
+        self.autoscale_throttled(self.autoscale.resume_processes, asg_physical_id, ["ScheduledActions"])
 
     def suspend_processes(self, asg_physical_id):
-        self.autoscale.suspend_processes(asg_physical_id, ["ScheduledActions"])
+        self.autoscale_throttled(self.autoscale.suspend_processes, asg_physical_id, ["ScheduledActions"])
 
     def instance_ids_in_autoscaling_group(self, asg_physical_id):
-        asg = self.autoscale.get_all_groups(names=[asg_physical_id])
-        return [inst.instance_id for inst in asg[0].instances]
+        return [inst.instance_id for inst in self.autoscaling_group(asg_physical_id).instances]
 
     def ips_for_instance_ids(self, instance_ids):
         for instance in self.instances(instance_ids):
             yield instance.private_ip_address
 
     def ip_for_instance_id(self, instance_id):
-        return self.conn.get_only_instances(instance_ids=[instance_id])[0].private_ip_address
+        return self.throttled(self.conn.get_only_instances, instance_ids=[instance_id])[0].private_ip_address
 
     def instances(self, instance_ids):
         if instance_ids:
-            for instance in self.conn.get_only_instances(instance_ids=instance_ids):
+            for instance in self.throttled(self.conn.get_only_instances, instance_ids=instance_ids):
                 yield instance
 
     def display_instances(self, instance_ids, address=NotSpecified):
@@ -1,6 +1,9 @@
+from bespin.amazon.mixin import AmazonMixin
 from bespin.helpers import memoized_property
 
 from input_algorithms.spec_base import NotSpecified
+import threading
+import hashlib
 import logging
 import base64
 import boto3
@@ -9,9 +12,19 @@ import six
 
 log = logging.getLogger("bespin.amazon.kms")
 
-class KMS(object):
-    def __init__(self, region="ap-southeast-2"):
+class KMS(AmazonMixin):
+    service = "kms"
+
+    # How long we trust decrypted values in the decrypt_cache for
+    decrypt_max_age = 3600
+
+    def __init__(self, region="ap-southeast-2", account_id=None, assume_role=None, decrypt_cache=None):
         self.region = region
+        self.account_id = account_id
+        self.assume_role = assume_role
+        self.decrypt_cache = decrypt_cache
+        self.decrypted = {}
+        self.decrypted_lock = threading.Lock()
 
     @memoized_property
     def conn(self):
@@ -22,7 +35,46 @@ class KMS(object):
     def session(self):
         return boto3.session.Session(region_name=self.region)
 
+    def decrypt_key(self, crypto_text, encryption_context=None):
+        """The key we remember decrypting this crypto_text with this encryption context, account and role by"""
+        if not encryption_context or encryption_context is NotSpecified:
+            encryption_context = {}
+        if isinstance(crypto_text, six.text_type):
+            crypto_text = crypto_text.encode("utf-8")
+
+        assume_role = "" if self.assume_role in (None, NotSpecified) else self.assume_role
+        context = json.dumps([self.region, str(self.account_id or ""), assume_role, encryption_context], sort_keys=True).encode("utf-8")
+        return hashlib.sha256(context + b"\n" + crypto_text).hexdigest()
+
     def decrypt(self, crypto_text, encryption_context=None, grant_tokens=None):
+        """
+        Decrypt crypto_text, only asking amazon once for each crypto_text and encryption context
+
+        If we have a decrypt_cache we also remember the plaintext there for
+        ``decrypt_max_age`` seconds.
+        """
+        key = self.decrypt_key(crypto_text, encryption_context)
+        with self.decrypted_lock:
+            if key in self.decrypted:
+                return self.decrypted[key]
+
+        result = None
+        if self.decrypt_cache is not None:
+            cached = self.decrypt_cache.get(key, max_age=self.decrypt_max_age)
+            if cached is not None:
+                log.debug("Using cached decrypted value\tkey_id=%s", cached["KeyId"])
+                result = {"KeyId": cached["KeyId"], "Plaintext": base64.b64decode(cached["Plaintext"])}
+
+        if result is None:
+            result = self.decrypt_uncached(crypto_text, encryption_context, grant_tokens)
+            if self.decrypt_cache is not None:
+                plain_text = base64.b64encode(result["Plaintext"]).decode("utf-8")
+                self.decrypt_cache.set(key, {"KeyId": result.get("KeyId"), "Plaintext": plain_text})
+
+        with self.decrypted_lock:
+            return self.decrypted.setdefault(key, result)
+
+    def decrypt_uncached(self, crypto_text, encryption_context=None, grant_tokens=None):
         kms_args = {
             'CiphertextBlob': crypto_text,
         }
@@ -31,7 +83,7 @@ class KMS(object):
         if grant_tokens and grant_tokens is not NotSpecified:
             kms_args['GrantTokens'] = grant_tokens
 
-        return self.conn.decrypt(**kms_args)
+        return self.throttled(self.conn.decrypt, **kms_args)
 
     def encrypt(self, key_id, plain_text, encryption_context=None, grant_tokens=None):
         kms_args = {
@@ -43,4 +95,4 @@ class KMS(object):
         if grant_tokens and grant_tokens is not NotSpecified:
             kms_args['GrantTokens'] = grant_tokens
 
-        return self.conn.encrypt(**kms_args)
+        return self.throttled(self.conn.encrypt, **kms_args)
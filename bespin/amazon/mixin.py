@@ -1,3 +1,4 @@
+from bespin.amazon.throttling import limiter, is_throttle
 from bespin.errors import Throttled
 
 from contextlib import contextmanager
@@ -7,6 +8,13 @@ import botocore
 log = logging.getLogger("bespin.amazon.mixin")
 
 class AmazonMixin(object):
+    # The name of the service for the rate limiter
+    service = None
+
+    def throttled(self, func, *args, **kwargs):
+        """Call func when the rate limiter for our service and region lets us"""
+        return limiter.call(self.service, self.region, func, *args, **kwargs)
+
     @contextmanager
     def catch_boto_400(self, errorkls, message, **info):
         """Turn a boto HTTP 400 into a BadAmazon"""
@@ -26,7 +34,7 @@ class AmazonMixin(object):
         try:
             yield
         except botocore.exceptions.ClientError as error:
-            if error.response['Error']['Code'] == 'Throttling':
+            if is_throttle(error):
                 raise Throttled()
             else:
                 raise
@@ -1,4 +1,5 @@
 from bespin.errors import BadS3Bucket, BespinError
+from bespin.amazon.mixin import AmazonMixin
 from bespin import helpers as hp
 
 from six.moves.urllib.parse import urlparse
@@ -6,6 +7,7 @@ from collections import namedtuple
 
 from datetime import datetime
 
+import threading
 import botocore
 import humanize
 import logging
@@ -16,7 +18,8 @@ log = logging.getLogger("bespin.amazon.s3")
 
 S3Location = namedtuple("S3Location", ["bucket", "key", "full"])
 
-class S3(object):
+class S3(AmazonMixin):
+    service = "s3"
 
     def __init__(self, region="ap-southeast-2"):
         self.region = region
@@ -60,7 +63,7 @@ class S3(object):
         bucket = self.get_bucket(to_location.bucket)
 
         log.info("Copying %s to %s", frm, to)
-        bucket.copy(copy_source, to_location[1:])
+        self.throttled(bucket.copy, copy_source, to_location[1:])
 
     def wait_for(self, bucket, key, timeout, start=None):
         if start is None:
@@ -94,10 +97,141 @@ class S3(object):
         bucket = self.get_bucket(query.bucket)
         return bucket.objects.filter(Prefix=query.key[1:])
 
-    def upload_file_to_s3(self, source_filename, destination_path):
+    def object_metadata(self, path):
+        """Return the user metadata of the object at this s3 path or None if it doesn't exist"""
+        location = self.s3_location(path)
+        try:
+            return self.throttled(self.conn.head_object, Bucket=location.bucket, Key=location.key[1:]).get("Metadata", {})
+        except botocore.exceptions.ClientError as error:
+            if error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def upload_file_to_s3(self, source_filename, destination_path, metadata=None):
         source = os.path.abspath(source_filename)
         source_size = os.stat(source).st_size
         dest = self.s3_location(destination_path)
 
+        kwargs = {}
+        if metadata:
+            kwargs["ExtraArgs"] = {"Metadata": metadata}
+
         log.info("Uploading from %s (%s) to %s", source, humanize.naturalsize(source_size), dest.full)
-        self.conn.upload_file(source, dest.bucket, dest.key[1:])
+        self.throttled(self.conn.upload_file, source, dest.bucket, dest.key[1:], **kwargs)
+
+    def multipart_upload(self, destination_path, part_size=None, max_parallel=None, metadata=None):
+        """Return a MultipartUpload that writes to this s3 path"""
+        dest = self.s3_location(destination_path)
+        log.info("Streaming upload to %s", dest.full)
+        kwargs = {"metadata": metadata}
+        if part_size is not None:
+            kwargs["part_size"] = part_size
+        if max_parallel is not None:
+            kwargs["max_parallel"] = max_parallel
+        return MultipartUpload(self, dest.bucket, dest.key[1:], **kwargs)
+
+class MultipartUpload(object):
+    """
+    A file like object that uploads what is written to it as a multipart upload
+
+    Parts are uploaded ``max_parallel`` at a time while we keep writing, so we
+    never hold more than ``max_parallel + 1`` parts in memory. Use it as a
+    context manager so the upload is aborted if anything goes wrong.
+    """
+    def __init__(self, s3, bucket, key, part_size=16 * 1024 * 1024, max_parallel=4, metadata=None):
+        self.s3 = s3
+        self.key = key
+        self.metadata = metadata
+        self.bucket = bucket
+        self.part_size = part_size
+        self.max_parallel = max_parallel
+
+        self.size = 0
+        self.parts = {}
+        self.errors = []
+        self.threads = []
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.slots = threading.BoundedSemaphore(max_parallel)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, data):
+        self.buffer.extend(data)
+        while len(self.buffer) >= self.part_size:
+            self.send(bytes(self.buffer[:self.part_size]))
+            del self.buffer[:self.part_size]
+
+    def flush(self):
+        pass
+
+    def send(self, body):
+        """Upload this part in a thread once one of our slots is free"""
+        if self.upload_id is None:
+            kwargs = {}
+            if self.metadata:
+                kwargs["Metadata"] = self.metadata
+            res = self.s3.throttled(self.s3.conn.create_multipart_upload, Bucket=self.bucket, Key=self.key, **kwargs)
+            self.upload_id = res["UploadId"]
+
+        self.slots.acquire()
+        if self.errors:
+            self.slots.release()
+            raise self.errors[0]
+
+        number = len(self.threads) + 1
+        self.size += len(body)
+        thread = threading.Thread(target=self.upload_part, args=(number, body))
+        thread.daemon = True
+        self.threads.append(thread)
+        thread.start()
+
+    def upload_part(self, number, body):
+        try:
+            res = self.s3.throttled(self.s3.conn.upload_part
+                , Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=body
+                )
+            self.parts[number] = res["ETag"]
+        except Exception as error:
+            log.error("Failed to upload part %s of %s\terror=%s", number, self.key, error)
+            self.errors.append(error)
+        finally:
+            self.slots.release()
+
+    def wait(self):
+        for thread in self.threads:
+            thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def close(self):
+        """Upload what's left and finish the upload"""
+        try:
+            if self.buffer or not self.threads:
+                self.send(bytes(self.buffer))
+                del self.buffer[:]
+            self.wait()
+        except Exception:
+            self.abort()
+            raise
+
+        parts = [{"ETag": self.parts[number], "PartNumber": number} for number in sorted(self.parts)]
+        self.s3.throttled(self.s3.conn.complete_multipart_upload
+            , Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": parts}
+            )
+        log.info("Finished uploading %s to s3://%s/%s in %s parts", humanize.naturalsize(self.size), self.bucket, self.key, len(parts))
+
+    def abort(self):
+        """Wait for parts in flight and throw away the upload"""
+        for thread in self.threads:
+            thread.join()
+        if self.upload_id is not None:
+            log.error("Aborting upload to s3://%s/%s", self.bucket, self.key)
+            self.s3.throttled(self.s3.conn.abort_multipart_upload, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
@@ -1,4 +1,5 @@
 from bespin.helpers import memoized_property, until
+from bespin.amazon.mixin import AmazonMixin
 from bespin.errors import BadSQSMessage
 
 import boto.sqs
@@ -19,7 +20,9 @@ class Message(namedtuple("Message", ["result", "instance_id", "output"])):
         result, instance_id, output = message.split(':', 2)
         return kls(result=result, instance_id=instance_id, output=output)
 
-class SQS(object):
+class SQS(AmazonMixin):
+    service = "sqs"
+
     def __init__(self, region="ap-southeast-2"):
         self.region = region
 
@@ -37,14 +40,14 @@ class SQS(object):
         We will eventually timeout and return what we have if we keep getting invalid messages or keep getting no messages.
         """
         messages = []
-        q = self.conn.get_queue(sqs_url)
+        q = self.throttled(self.conn.get_queue, sqs_url)
         for _ in until(timeout, step=sleep):
-            while q.count() > 0:
-                raw_messages = self.conn.receive_message(q, number_messages=1)
+            while self.throttled(q.count) > 0:
+                raw_messages = self.throttled(self.conn.receive_message, q, number_messages=1)
                 for raw_message in raw_messages:
                     encoded_message = json.loads(raw_message.get_body())['Message']
 
-                    q.delete_message(raw_message)
+                    self.throttled(q.delete_message, raw_message)
 
                     try:
                         messages.append(Message.decode(encoded_message))
@@ -0,0 +1,155 @@
+"""
+Process wide rate limiting for calls to amazon
+
+Every call goes through a token bucket for its service and region so that
+many stacks being deployed at the same time share the same budget of calls.
+
+When amazon throttles us anyway we back off exponentially with jitter and
+slow the bucket down for everyone, speeding it back up as calls succeed.
+"""
+from bespin.errors import Throttled
+
+import boto.exception
+import botocore
+import threading
+import logging
+import random
+import time
+
+log = logging.getLogger("bespin.amazon.throttling")
+
+throttling_codes = set([
+      "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottled"
+    , "RequestLimitExceeded", "TooManyRequestsException", "SlowDown"
+    ])
+
+def is_throttle(error):
+    """Say whether this exception from boto or botocore means amazon throttled us"""
+    if isinstance(error, botocore.exceptions.ClientError):
+        return error.response.get('Error', {}).get('Code') in throttling_codes
+    if isinstance(error, boto.exception.BotoServerError):
+        return error.error_code in throttling_codes
+    return False
+
+class TokenBucket(object):
+    """
+    Hand out ``rate`` tokens a second, saving up to ``burst`` of them
+
+    ``slow_down`` halves the rate and ``speed_up`` slowly brings it back to
+    the rate we started with.
+    """
+    def __init__(self, rate, burst, min_rate=0.2):
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = rate
+        self.min_rate = min_rate
+
+        self.tokens = burst
+        self.lock = threading.Lock()
+        self.updated = time.time()
+
+    def take(self):
+        """Wait till there is a token, take it and return how long we waited"""
+        waited = 0
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def slow_down(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2.0)
+
+    def speed_up(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class RateLimiter(object):
+    """
+    Token buckets per (service, region) and counters of what happened
+
+    ``limits`` is ``{service: (rate, burst)}`` for services that shouldn't use
+    the default ``rate`` and ``burst``.
+    """
+    def __init__(self, rate=10, burst=20, limits=None, attempts=10, backoff=0.5, max_backoff=20):
+        self.rate = rate
+        self.burst = burst
+        self.limits = limits or {}
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.counters = {}
+
+    def limits_for(self, service):
+        """Return (rate, burst) for this service"""
+        return self.limits.get(service, (self.rate, self.burst))
+
+    def bucket(self, service, region):
+        key = (service, region)
+        with self.lock:
+            if key not in self.buckets:
+                rate, burst = self.limits_for(service)
+                self.buckets[key] = TokenBucket(rate, burst)
+                self.counters[key] = {"calls": 0, "throttles": 0, "retries": 0, "waited": 0}
+            return self.buckets[key]
+
+    def count(self, service, region, name, amount=1):
+        with self.lock:
+            self.counters[(service, region)][name] += amount
+
+    def stats(self):
+        """Return {(service, region): {"calls", "throttles", "retries", "waited"}}"""
+        with self.lock:
+            return dict((key, dict(counters)) for key, counters in self.counters.items())
+
+    def log_stats(self):
+        """Log what we did with each service, at info level if amazon throttled us"""
+        for (service, region), counters in sorted(self.stats().items()):
+            level = logging.INFO if counters["throttles"] else logging.DEBUG
+            log.log(level, "Calls to amazon\tservice=%s\tregion=%s\tcalls=%s\tthrottles=%s\tretries=%s\twaited=%.1fs"
+                , service, region, counters["calls"], counters["throttles"], counters["retries"], counters["waited"]
+                )
+
+    def delay(self, attempt):
+        """Full jitter: anywhere up to the exponential backoff for this attempt"""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self, service, region, func, *args, **kwargs):
+        """Call func when the bucket lets us, retrying if amazon throttles us"""
+        bucket = self.bucket(service, region)
+        for attempt in range(self.attempts):
+            if attempt > 0:
+                self.count(service, region, "retries")
+
+            self.count(service, region, "waited", bucket.take())
+            self.count(service, region, "calls")
+            try:
+                result = func(*args, **kwargs)
+            except Exception as error:
+                if not is_throttle(error):
+                    raise
+                self.count(service, region, "throttles")
+                bucket.slow_down()
+                if attempt + 1 == self.attempts:
+                    break
+                delay = self.delay(attempt)
+                log.info("Was throttled by %s in %s, waiting %.1f seconds", service, region, delay)
+                time.sleep(delay)
+                self.count(service, region, "waited", delay)
+            else:
+                bucket.speed_up()
+                return result
+
+        raise Throttled(service=service, region=region, attempts=self.attempts)
+
+limiter = RateLimiter(limits={"cloudformation": (4, 8), "autoscaling": (4, 8)})
@@ -0,0 +1,169 @@
+"""
+Small caches that live on disk under ``~/.cache/bespin``
+
+Each cache is a sqlite file of json values. A broken or unwritable cache is
+logged and treated as a miss so that it never stops bespin from working.
+"""
+from bespin.errors import BespinError
+
+from contextlib import contextmanager
+import logging
+import errno
+import sqlite3
+import pickle
+import json
+import time
+import os
+
+log = logging.getLogger("bespin.cache")
+
+def cache_dir():
+    """Return the folder we keep our caches in"""
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "bespin")
+
+class DiskCache(object):
+    """
+    A sqlite table of ``{key: json value}``
+
+    When the values add up to more than ``max_size`` bytes we forget the ones
+    that were used least recently.
+    """
+    # Errors from loads that mean the value is broken
+    load_errors = (ValueError, )
+
+    def __init__(self, name, max_size=10 * 1024 * 1024, location=None):
+        self.name = name
+        self.max_size = max_size
+        self.location = location or os.path.join(cache_dir(), "{0}.sqlite".format(name))
+
+    @contextmanager
+    def connection(self):
+        parent = os.path.dirname(self.location)
+        if parent and not os.path.exists(parent):
+            os.makedirs(parent)
+
+        conn = sqlite3.connect(self.location, timeout=10)
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, size INTEGER, stored REAL, used REAL)")
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, key, max_age=None):
+        """Return the value for this key or None if we don't have one from the last max_age seconds"""
+        try:
+            with self.connection() as conn:
+                row = conn.execute("SELECT value, stored FROM entries WHERE key = ?", (key, )).fetchone()
+                if row is None:
+                    return None
+
+                value, stored = row
+                if max_age is not None and time.time() - stored > max_age:
+                    return None
+
+                conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+                return self.loads(value)
+        except (sqlite3.Error, EnvironmentError) + self.load_errors as error:
+            log.warning("Failed to read from the %s cache\terror=%s", self.name, error)
+
+    def set(self, key, value):
+        """Remember this value, forgetting old values if we have too many"""
+        dumped = self.dumps(value)
+        now = time.time()
+        try:
+            with self.connection() as conn:
+                conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)", (key, dumped, len(dumped), now, now))
+                self.evict(conn)
+        except (sqlite3.Error, EnvironmentError) as error:
+            log.warning("Failed to write to the %s cache\terror=%s", self.name, error)
+
+    def dumps(self, value):
+        return json.dumps(value, sort_keys=True)
+
+    def loads(self, value):
+        return json.loads(value)
+
+    def delete(self, key):
+        try:
+            with self.connection() as conn:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key, ))
+        except (sqlite3.Error, EnvironmentError) as error:
+            log.warning("Failed to delete from the %s cache\terror=%s", self.name, error)
+
+    def evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_size:
+            return
+
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY used").fetchall():
+            if total <= self.max_size:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key, ))
+            total -= size
+
+class PickledDiskCache(DiskCache):
+    """A DiskCache for values json can't store, like dates in parsed yaml"""
+    load_errors = (ValueError, EOFError, AttributeError, ImportError, pickle.UnpicklingError)
+
+    def dumps(self, value):
+        return sqlite3.Binary(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def loads(self, value):
+        return pickle.loads(bytes(value))
+
+class EncryptedDiskCache(DiskCache):
+    """
+    A DiskCache for secrets that encrypts the values it stores
+
+    The key lives next to the cache and is only readable by the current user.
+    Deleting it forgets everything in the cache.
+    """
+    def __init__(self, name, **kwargs):
+        super(EncryptedDiskCache, self).__init__(name, **kwargs)
+        self.key_location = "{0}.key".format(os.path.splitext(self.location)[0])
+
+    def fernet(self):
+        """Return a Fernet using our key, making the key if we don't have one yet"""
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            raise BespinError("Need the cryptography package to cache passwords, install bespin[passwords]", cache=self.name)
+
+        if not os.path.exists(self.key_location):
+            parent = os.path.dirname(self.key_location)
+            if parent and not os.path.exists(parent):
+                os.makedirs(parent)
+
+            try:
+                fd = os.open(self.key_location, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            except OSError as error:
+                if error.errno != errno.EEXIST:
+                    raise
+            else:
+                with os.fdopen(fd, "wb") as fle:
+                    fle.write(Fernet.generate_key())
+
+        with open(self.key_location, "rb") as fle:
+            return Fernet(fle.read().strip())
+
+    def get(self, key, max_age=None):
+        token = super(EncryptedDiskCache, self).get(key, max_age=max_age)
+        if token is None:
+            return None
+
+        fernet = self.fernet()
+        from cryptography.fernet import InvalidToken
+
+        try:
+            return json.loads(fernet.decrypt(token.encode("utf-8")).decode("utf-8"))
+        except (InvalidToken, EnvironmentError, ValueError) as error:
+            log.warning("Failed to read from the %s cache\terror=%s", self.name, error.__class__.__name__)
+
+    def set(self, key, value):
+        try:
+            token = self.fernet().encrypt(json.dumps(value, sort_keys=True).encode("utf-8")).decode("utf-8")
+        except (EnvironmentError, ValueError) as error:
+            log.warning("Failed to write to the %s cache\terror=%s", self.name, error.__class__.__name__)
+        else:
+            super(EncryptedDiskCache, self).set(key, token)
@@ -6,6 +6,7 @@ from bespin.errors import BadConfiguration, BadYaml, BespinError
 from bespin.formatter import MergedOptionStringFormatter
 from bespin.option_spec.bespin_specs import BespinSpec
 from bespin.actions import available_actions
+from bespin.cache import PickledDiskCache
 from bespin.task_finder import TaskFinder
 
 from input_algorithms.spec_base import NotSpecified
@@ -19,7 +20,9 @@ from option_merge import Converter
 
 from ruamel.yaml import YAML
 import ruamel.yaml
+import hashlib
 import logging
+import time
 import six
 import os
 
@@ -30,6 +33,21 @@ class Collector(Collector):
     BadFileErrorKls = BadYaml
     BadConfigurationErrorKls = BadConfiguration
 
+    # Where we remember parsed yaml files, made by prepare unless --no-cache
+    yaml_cache = None
+
+    # Files changed this recently might change again without their mtime changing
+    racy_mtime_window = 2
+
+    def setup(self):
+        super(Collector, self).setup()
+        self.stack_bases = {}
+
+    def prepare(self, configuration_file, args_dict, extra_files=None):
+        if not (args_dict.get("bespin") or {}).get("no_cache"):
+            self.yaml_cache = PickledDiskCache("parsed_yaml", max_size=50 * 1024 * 1024)
+        return super(Collector, self).prepare(configuration_file, args_dict, extra_files=extra_files)
+
     def alter_clone_args_dict(self, new_collector, new_args_dict, options=None):
         return MergedOptions.using(
               new_args_dict
@@ -108,8 +126,36 @@ class Collector(Collector):
 
     def read_file(self, location):
         """Read in a yaml file and return as a python object"""
+        if self.yaml_cache is None:
+            with open(location, "rb") as fle:
+                return self.parse_yaml(location, fle.read())
+
+        start = time.time()
+        location = os.path.abspath(location)
+        mtime = os.stat(location).st_mtime
+        cached = self.yaml_cache.get(location)
+
+        if cached is not None and cached["mtime"] == mtime and cached["checked"] - mtime > self.racy_mtime_window:
+            log.debug("Parsed yaml cache hit\tlocation=%s\ttook=%.4fs", location, time.time() - start)
+            return cached["data"]
+
+        with open(location, "rb") as fle:
+            content = fle.read()
+        digest = hashlib.sha256(content).hexdigest()
+
+        if cached is not None and cached["digest"] == digest:
+            data = cached["data"]
+            log.debug("Parsed yaml cache hit\tlocation=%s\ttook=%.4fs", location, time.time() - start)
+        else:
+            data = self.parse_yaml(location, content)
+            log.debug("Parsed yaml cache miss\tlocation=%s\ttook=%.4fs", location, time.time() - start)
+
+        self.yaml_cache.set(location, {"mtime": mtime, "checked": time.time(), "digest": digest, "data": data})
+        return data
+
+    def parse_yaml(self, location, content):
         try:
-            return YAML(typ='safe').load(open(location))
+            return YAML(typ='safe').load(content)
         except ruamel.yaml.parser.ParserError as error:
             raise self.BadFileErrorKls("Failed to read yaml", location=location, error_type=error.__class__.__name__, error="{0}{1}".format(error.problem, error.problem_mark))
 
@@ -145,6 +191,25 @@ class Collector(Collector):
                 return Converter(convert=converter, convert_path=[path])
             configuration.add_converter(make_converter(path))
 
+    def stack_base_layers(self, configuration, environment):
+        """
+        Return (config_as_dict, env, environment_as_dict) for converting stacks in this environment
+
+        These are the same for every stack, so we only make them again if the
+        configuration changes. They are only ever used as layers under each
+        stack's own options, so every stack can share them.
+        """
+        key = (environment, str(configuration.version))
+        if key not in self.stack_bases:
+            config_as_dict = configuration.as_dict(ignore=["stacks"])
+
+            env = configuration[["environments", environment]]
+            if isinstance(env, six.string_types):
+                env = configuration[["environments", env]]
+
+            self.stack_bases = {key: (config_as_dict, env, env.as_dict())}
+        return self.stack_bases[key]
+
     def make_stack_converters(self, stack, configuration, bespin_spec):
         """Make converters for this stack and add them to the configuration"""
         def convert_stack(path, val):
@@ -152,17 +217,11 @@ class Collector(Collector):
             configuration.converters.started(path)
             environment = configuration['bespin'].environment
 
-            config_as_dict = configuration.as_dict(ignore=["stacks"])
             val_as_dict = val.as_dict(ignore=["stacks"])
             if not environment or environment is NotSpecified:
                 raise BespinError("No environment was provided", available=list(configuration["environments"].keys()))
 
-            env = configuration[["environments", environment]]
-            if isinstance(env, six.string_types):
-                environment_as_dict = configuration[["environments", env]].as_dict()
-                env = configuration[["environments", env]]
-            else:
-                environment_as_dict = configuration[["environments", environment]].as_dict()
+            config_as_dict, env, environment_as_dict = self.stack_base_layers(configuration, environment)
 
             stack_environment = {}
             stack_environment_as_dict = {}
@@ -0,0 +1,250 @@
+"""
+File like objects that compress what is written to them before writing it to
+another file object, and a zip file that compresses its members in parallel.
+
+These let us compress a streamed tar with a chosen level, across several
+threads and with compressors that tarfile doesn't know about.
+
+Reproducible archives have the same bytes every time they are made from the
+same files. Nothing we write has a timestamp or file name in its gzip header.
+"""
+from bespin.errors import BadCompression
+
+from multiprocessing.pool import ThreadPool
+from collections import deque
+import multiprocessing
+import logging
+import zipfile
+import tarfile
+import shutil
+import time
+import zlib
+import sys
+import os
+
+log = logging.getLogger("bespin.compression")
+
+# ParallelZipFile relies on ZipFile internals that are the same from python3.7 onwards
+parallel_zip_supported = sys.version_info >= (3, 7)
+
+# Everything in a reproducible archive is from the start of 1980, the earliest a zip can be
+reproducible_date_time = (1980, 1, 1, 0, 0, 0)
+reproducible_mtime = 315532800
+
+def reproducible_mode(mode, is_dir=False):
+    """Return 0755 for folders and executables and 0644 for everything else"""
+    return 0o755 if is_dir or mode & 0o111 else 0o644
+
+def reproducible_tarinfo(tarinfo):
+    """Remove from this TarInfo what changes between builds"""
+    tarinfo.mtime = reproducible_mtime
+    tarinfo.uid = tarinfo.gid = 0
+    tarinfo.uname = tarinfo.gname = ""
+    tarinfo.mode = reproducible_mode(tarinfo.mode, is_dir=tarinfo.isdir())
+    return tarinfo
+
+class ReproducibleTarFile(tarfile.TarFile):
+    """A TarFile that adds everything with reproducible_tarinfo"""
+    def add(self, name, arcname=None, recursive=True, **kwargs):
+        kwargs["filter"] = reproducible_tarinfo
+        return super(ReproducibleTarFile, self).add(name, arcname, recursive, **kwargs)
+
+def cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+def gzip_member(data, level):
+    """Return data as a complete gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+def deflate_member(data, level):
+    """Return (crc, compressed) for a zip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return zlib.crc32(data) & 0xffffffff, compressor.compress(data) + compressor.flush()
+
+class CompressingWriter(object):
+    """Write what we're given through a compressobj into fileobj"""
+    def __init__(self, fileobj, compressor):
+        self.fileobj = fileobj
+        self.compressor = compressor
+
+    def write(self, data):
+        compressed = self.compressor.compress(data)
+        if compressed:
+            self.fileobj.write(compressed)
+        return len(data)
+
+    def close(self):
+        self.fileobj.write(self.compressor.flush())
+
+class ParallelGzipWriter(object):
+    """
+    Compress every block_size bytes we're given into a separate gzip member
+    in a pool of threads
+
+    The members are written to fileobj in order, so the result is a valid
+    multi member gzip that anything that reads gzip can decompress. At most
+    two blocks per thread are in memory at any time.
+    """
+    def __init__(self, fileobj, level=6, threads=None, block_size=4 * 1024 * 1024):
+        self.level = level
+        self.fileobj = fileobj
+        self.threads = threads or cpu_count()
+        self.block_size = block_size
+
+        self.buf = bytearray()
+        self.pending = deque()
+        self.pool = ThreadPool(self.threads)
+        self.written_member = False
+
+    def write(self, data):
+        self.buf.extend(data)
+        while len(self.buf) >= self.block_size:
+            self.compress(bytes(self.buf[:self.block_size]))
+            del self.buf[:self.block_size]
+        return len(data)
+
+    def compress(self, block):
+        """Compress this block in the pool and write out what has finished"""
+        while len(self.pending) >= self.threads * 2:
+            self.fileobj.write(self.pending.popleft().get())
+        self.pending.append(self.pool.apply_async(gzip_member, (block, self.level)))
+        self.written_member = True
+
+    def close(self):
+        try:
+            if self.buf or not self.written_member:
+                self.compress(bytes(self.buf))
+                self.buf = bytearray()
+            while self.pending:
+                self.fileobj.write(self.pending.popleft().get())
+        finally:
+            self.pool.close()
+            self.pool.join()
+
+class ParallelZipFile(zipfile.ZipFile):
+    """
+    A zip file that deflates its members in a pool of threads
+
+    Members are written in the order they are added. At most two members per
+    thread are waiting to be written and files bigger than max_member_size are
+    streamed into the zip after everything before them.
+
+    If reproducible is True then every member has the same date and a mode of
+    either 0755 or 0644.
+
+    Members deflated in the pool are written with the same ZipFile internals
+    that ZipFile.write uses for folders, so only use this when
+    parallel_zip_supported is True.
+    """
+    def __init__(self, filename, level=6, threads=None, max_member_size=16 * 1024 * 1024, reproducible=False):
+        super(ParallelZipFile, self).__init__(filename, "w", zipfile.ZIP_DEFLATED, compresslevel=level)
+        self.level = level
+        self.threads = threads or cpu_count()
+        self.reproducible = reproducible
+        self.max_member_size = max_member_size
+
+        self.pending = deque()
+        self.pool = ThreadPool(self.threads)
+
+    def zip_info(self, arcname, st):
+        """Make a ZipInfo for a file with this os.stat"""
+        arcname = os.path.normpath(os.path.splitdrive(arcname)[1]).lstrip(os.sep)
+        if self.reproducible:
+            zinfo = zipfile.ZipInfo(arcname, reproducible_date_time)
+            zinfo.external_attr = (0o100000 | reproducible_mode(st.st_mode)) << 16
+        else:
+            zinfo = zipfile.ZipInfo(arcname, time.localtime(st.st_mtime)[0:6])
+            zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+        zinfo.compress_type = zipfile.ZIP_DEFLATED
+        zinfo._compresslevel = self.level
+        return zinfo
+
+    def add(self, filename, arcname):
+        st = os.stat(filename)
+        zinfo = self.zip_info(arcname, st)
+
+        if st.st_size > self.max_member_size:
+            self.write_pending()
+            zinfo.file_size = st.st_size
+            self.write_large_member(zinfo, filename)
+            return
+
+        # Read it now in case the file doesn't exist by the time we compress it
+        with open(filename, "rb") as fle:
+            data = fle.read()
+        zinfo.file_size = len(data)
+
+        while len(self.pending) >= self.threads * 2:
+            self.write_member(*self.pending.popleft())
+        self.pending.append((zinfo, self.pool.apply_async(deflate_member, (data, self.level))))
+
+    def write_pending(self):
+        while self.pending:
+            self.write_member(*self.pending.popleft())
+
+    def write_member(self, zinfo, result):
+        """Write a deflated member the same way ZipFile.write writes a directory"""
+        zinfo.CRC, compressed = result.get()
+        zinfo.compress_size = len(compressed)
+
+        with self._lock:
+            if self._seekable:
+                self.fp.seek(self.start_dir)
+            zinfo.header_offset = self.fp.tell()
+
+            self._writecheck(zinfo)
+            self._didModify = True
+
+            self.filelist.append(zinfo)
+            self.NameToInfo[zinfo.filename] = zinfo
+            self.fp.write(zinfo.FileHeader())
+            self.fp.write(compressed)
+            self.start_dir = self.fp.tell()
+
+    def write_large_member(self, zinfo, filename):
+        """Let ZipFile deflate a big file into the zip a chunk at a time"""
+        with open(filename, "rb") as src:
+            with self.open(zinfo, "w") as dest:
+                shutil.copyfileobj(src, dest, 1024 * 1024)
+
+    def close(self):
+        if self.fp is None:
+            return
+        try:
+            self.write_pending()
+        finally:
+            self.pool.close()
+            self.pool.join()
+            super(ParallelZipFile, self).close()
+
+def writer(fileobj, compression, level=None, threads=None):
+    """
+    Return a file like object that compresses into fileobj
+
+    compression is one of gz, xz or zstd. Gzip is compressed in parallel when
+    threads is more than one and zstd uses every cpu unless told otherwise.
+    """
+    if compression == "gz":
+        level = 6 if level is None else level
+        if threads and threads > 1:
+            return ParallelGzipWriter(fileobj, level=level, threads=threads)
+        return CompressingWriter(fileobj, zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS))
+
+    elif compression == "xz":
+        import lzma
+        return CompressingWriter(fileobj, lzma.LZMACompressor(preset=6 if level is None else level))
+
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise BadCompression("Need the zstandard package to make zstd archives", compression=compression)
+        threads = -1 if threads is None else threads
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=threads)
+        return CompressingWriter(fileobj, compressor.compressobj())
+
+    raise BadCompression("Unknown compression", compression=compression, available=["gz", "xz", "zstd"])
@@ -61,6 +61,12 @@ class BadDeployment(BespinError):
 class InvalidArtifact(BespinError):
     desc = "Chosen artifact is invalid"
 
+class BadCompression(BespinError):
+    desc = "Bad compression"
+
+class FailedStacks(BespinError):
+    desc = "Some stacks failed to deploy"
+
 ########################
 ###   AMAZON
 ########################
@@ -87,6 +93,9 @@ class StackDoesntExist(BadAmazon):
 class StackDepCycle(BespinError):
     desc = "Stack dependency cycle"
 
+class VariableCycle(BespinError):
+    desc = "Variables refer to each other in a cycle"
+
 class CouldntKill(BespinError):
     desc = "Failed to kill a process"
 
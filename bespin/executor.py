@@ -4,12 +4,14 @@ the argument parsing and for starting up Bespin.
 """
 
 from bespin.collector import Collector
+from bespin import helpers as hp
 from bespin import VERSION
 
 from input_algorithms.spec_base import NotSpecified
 from delfick_app import App
 import argparse
 import logging
+import sys
 
 class App(App):
     VERSION = VERSION
@@ -23,12 +25,19 @@ class App(App):
     def execute(self, args_obj, args_dict, extra_args, logging_handler):
         collector = Collector()
         args_dict["bespin"]["extra"] = extra_args
+        logging_handler.addFilter(hp.LogPrefixFilter())
 
         collector.prepare(args_obj.bespin_config.name, args_dict)
         if "term_colors" in collector.configuration:
             self.setup_logging_theme(logging_handler, colors=collector.configuration["term_colors"])
 
-        collector.configuration["task_runner"](collector.configuration["bespin"].chosen_task)
+        try:
+            collector.configuration["task_runner"](collector.configuration["bespin"].chosen_task)
+        finally:
+            # Only report on calls to amazon if something made them
+            throttling = sys.modules.get("bespin.amazon.throttling")
+            if throttling is not None:
+                throttling.limiter.log_stats()
 
     def setup_other_logging(self, args_obj, verbose=False, silent=False, debug=False):
         logging.getLogger("boto").setLevel([logging.CRITICAL, logging.ERROR][verbose or debug])
@@ -55,6 +64,43 @@ class App(App):
             , action = "store_true"
             )
 
+        parser.add_argument("--max-parallel"
+            , help = "The number of stacks to deploy or validate at the same time"
+            , dest = "bespin_max_parallel"
+            , type = int
+            , default = 1
+            )
+
+        parser.add_argument("--no-cache"
+            , help = "Don't use or update the caches under ~/.cache/bespin"
+            , dest = "bespin_no_cache"
+            , action = "store_true"
+            )
+
+        parser.add_argument("--cache-passwords"
+            , help = "Keep decrypted passwords in an encrypted cache in ~/.cache/bespin for an hour"
+            , dest = "bespin_cache_passwords"
+            , action = "store_true"
+            )
+
+        parser.add_argument("--revalidate"
+            , help = "Ask amazon to validate templates even if we have already validated them"
+            , dest = "bespin_revalidate"
+            , action = "store_true"
+            )
+
+        parser.add_argument("--ignore-fingerprint"
+            , help = "Update stacks and publish artifacts even if nothing has changed since they were last deployed"
+            , dest = "bespin_ignore_fingerprint"
+            , action = "store_true"
+            )
+
+        parser.add_argument("--continue-on-error"
+            , help = "When deploying in parallel, keep deploying stacks that don't need a stack that failed"
+            , dest = "bespin_continue_on_error"
+            , action = "store_true"
+            )
+
         parser.add_argument("--command"
             , help = "Command to run for the command_on_instances task"
             , default = ""
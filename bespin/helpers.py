@@ -1,4 +1,9 @@
+from bespin.errors import ProgrammerError, BadCompression
+
+from six.moves import queue
+from collections import OrderedDict
 from contextlib import contextmanager
+import threading
 import tempfile
 import logging
 import shutil
@@ -9,6 +14,8 @@ import os
 
 log = logging.getLogger("bespin.helpers")
 
+log_context = threading.local()
+
 @contextmanager
 def a_temp_file():
     """Yield the name of a temporary file and ensure it's removed after use"""
@@ -36,17 +43,63 @@ class ZipTarWrapper(zipfile.ZipFile):
     def add(self, filename, arcname):
         self.write(filename, arcname)
 
-def generate_archive_file(location, paths, environment=None, compression=None, archive_format=None):
+def generate_archive_file(location, paths, environment=None, compression=None, archive_format=None, stream=False, compression_level=None, compression_threads=None, reproducible=False):
     """
     Generate an archive file at the specified location given the paths and files
+
+    If stream is True then location is a file like object we write the tar to
+    as it's made rather than a file we open by name. Zip files can't be
+    streamed.
+
+    Tar files are compressed by ``bespin.compression`` when we're given a
+    compression_level or compression_threads, the compression is zstd or the
+    archive is reproducible. Zip files deflate their members across
+    compression_threads threads.
+
+    If reproducible is True then making the archive from the same files always
+    makes the same bytes.
     """
     if archive_format == 'zip':
-        archive = ZipTarWrapper(location.name, 'w', zipfile.ZIP_DEFLATED)
+        if stream:
+            raise ProgrammerError("Zip archives can't be streamed")
+        from bespin.compression import ParallelZipFile, parallel_zip_supported
+        if reproducible and not parallel_zip_supported:
+            raise BadCompression("Reproducible zip artifacts need python3.7 or later", archive_format=archive_format)
+
+        if parallel_zip_supported and (reproducible or (compression_threads and compression_threads > 1)):
+            level = 6 if compression_level is None else compression_level
+            archive = ParallelZipFile(location.name, level=level, threads=compression_threads or 1, reproducible=reproducible)
+        else:
+            archive = ZipTarWrapper(location.name, 'w', zipfile.ZIP_DEFLATED)
     else:
-        write_type = "w"
-        if compression:
-            write_type = "w|{0}".format(compression)
-        archive = tarfile.open(location.name, write_type)
+        tar_kls = tarfile.TarFile
+        tar_options = {}
+        if reproducible:
+            from bespin.compression import ReproducibleTarFile
+            tar_kls = ReproducibleTarFile
+            tar_options["format"] = tarfile.GNU_FORMAT
+
+        if compression and (compression == "zstd" or compression_level is not None or compression_threads is not None or reproducible):
+            from bespin import compression as compressors
+            fileobj = location if stream else open(location.name, "wb")
+            try:
+                compressed = compressors.writer(fileobj, compression, level=compression_level, threads=compression_threads)
+                archive = tar_kls.open(fileobj=compressed, mode="w|", **tar_options)
+                for path_spec in paths:
+                    path_spec.add_to_tar(archive, environment)
+                archive.close()
+                compressed.close()
+            finally:
+                if not stream:
+                    fileobj.close()
+            return archive
+        elif stream:
+            archive = tar_kls.open(fileobj=location, mode="w|{0}".format(compression or ""), **tar_options)
+        else:
+            write_type = "w"
+            if compression:
+                write_type = "w|{0}".format(compression)
+            archive = tar_kls.open(location.name, write_type, **tar_options)
 
     # Add all the things to the archive
     for path_spec in paths:
@@ -74,6 +127,93 @@ def until(timeout=10, step=0.5, action=None, silent=False):
             time.sleep(step)
             yield
 
+@contextmanager
+def log_prefix(prefix):
+    """Prefix everything logged from this thread with ``[prefix]`` whilst in the context"""
+    previous = getattr(log_context, "prefix", None)
+    log_context.prefix = prefix
+    try:
+        yield
+    finally:
+        log_context.prefix = previous
+
+def prefixed(text):
+    """Put the current ``log_prefix`` in front of every line in this text"""
+    prefix = getattr(log_context, "prefix", None)
+    if not prefix:
+        return text
+    return "\n".join("[{0}] {1}".format(prefix, line) if line else line for line in text.split("\n"))
+
+class LogPrefixFilter(logging.Filter):
+    """Logging filter that adds the current ``log_prefix`` to each record"""
+    def filter(self, record):
+        prefix = getattr(log_context, "prefix", None)
+        if prefix and not getattr(record, "bespin_prefixed", False):
+            record.msg = "[{0}] {1}".format(prefix, record.msg)
+            record.bespin_prefixed = True
+        return True
+
+def run_concurrently(jobs, max_parallel=1, stop_on_error=False, log_errors=True):
+    """
+    Run ``[(name, func), ...]`` with at most ``max_parallel`` running at once
+
+    Each job is run inside ``log_prefix(name)``, or ``log_prefix("{prefix}:{name}")``
+    if we are already inside a ``log_prefix``.
+
+    Return an OrderedDict of ``{name: error}`` for each job that was run, where
+    error is None if the job didn't raise an exception. If ``stop_on_error`` is
+    True then no more jobs are started after one fails and those jobs are left
+    out of the result.
+
+    Errors are logged with their traceback unless ``log_errors`` is False, for
+    when the caller raises them itself.
+    """
+    jobs = list(jobs)
+    finished = {}
+    pending = queue.Queue()
+    for job in jobs:
+        pending.put(job)
+
+    lock = threading.Lock()
+    info = {"failed": False}
+    outer_prefix = getattr(log_context, "prefix", None)
+
+    def worker():
+        while True:
+            with lock:
+                if stop_on_error and info["failed"]:
+                    return
+                try:
+                    name, func = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+            failure = None
+            with log_prefix(name if not outer_prefix else "{0}:{1}".format(outer_prefix, name)):
+                try:
+                    func()
+                except Exception as error:
+                    if log_errors:
+                        log.exception("Failed to run %s", name)
+                    failure = error
+
+            with lock:
+                finished[name] = failure
+                if failure is not None:
+                    info["failed"] = True
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(max_parallel, len(jobs))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+
+    # Join with a timeout so that ctrl-c still gets to the main thread
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(0.5)
+
+    return OrderedDict((name, finished[name]) for name, _ in jobs if name in finished)
+
 class memoized_property(object):
     """Decorator to make a descriptor that memoizes it's value"""
     def __init__(self, func):
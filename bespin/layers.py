@@ -24,12 +24,13 @@ class Layers(object):
         if self.all_stacks is None:
             self.all_stacks = stacks
 
-        self.accounted = {}
-        self._layered = []
+        self.reset()
 
     def reset(self):
-        """Make a clean slate (initialize layered and accounted on the instance)"""
+        """Make a clean slate (initialize layered, accounted and our indexes on the instance)"""
         self.accounted = {}
+        self.layer_of = {}
+        self.dependency_index = {}
         self._layered = []
 
     @property
@@ -48,34 +49,53 @@ class Layers(object):
         for stack in sorted(self.stacks):
             self.add_to_layers(stack)
 
-    def add_to_layers(self, name, chain=None):
-        layered = self._layered
-
-        if name not in self.accounted:
-            self.accounted[name] = True
-        else:
+    def dependencies_of(self, name):
+        """Return the sorted dependencies of this stack, only asking the stack once"""
+        if name not in self.dependency_index:
+            self.dependency_index[name] = sorted(self.all_stacks[name].dependencies(self.all_stacks))
+        return self.dependency_index[name]
+
+    def add_to_layers(self, name):
+        """
+        Add this stack and everything it depends on to the layers
+
+        We walk the dependencies depth first without recursion so that long
+        chains of stacks don't hit the recursion limit. The stacks on the
+        current chain are kept in a set so cycles are found without searching.
+        """
+        if name in self.accounted:
             return
-
-        if chain is None:
-            chain = []
-        chain = chain + [name]
-
-        for dependency in sorted(self.all_stacks[name].dependencies(self.all_stacks)):
-            dep_chain = list(chain)
-            if dependency in chain:
-                dep_chain.append(dependency)
-                raise StackDepCycle(chain=dep_chain)
-            self.add_to_layers(dependency, dep_chain)
-
+        self.accounted[name] = True
+
+        chain = [name]
+        on_chain = set(chain)
+        walking = [iter(self.dependencies_of(name))]
+
+        while walking:
+            for dependency in walking[-1]:
+                if dependency in on_chain:
+                    raise StackDepCycle(chain=chain + [dependency])
+
+                if dependency not in self.accounted:
+                    self.accounted[dependency] = True
+                    chain.append(dependency)
+                    on_chain.add(dependency)
+                    walking.append(iter(self.dependencies_of(dependency)))
+                    break
+            else:
+                # All the dependencies of this stack are in layers now
+                walking.pop()
+                finished = chain.pop()
+                on_chain.discard(finished)
+                self.place_in_layer(finished)
+
+    def place_in_layer(self, name):
+        """Put this stack in the layer after the last of it's dependencies"""
         layer = 0
-        for dependency in self.all_stacks[name].dependencies(self.all_stacks):
-            for index, deps in enumerate(layered):
-                if dependency in deps:
-                    if layer <= index:
-                        layer = index + 1
-                    continue
-
-        if len(layered) == layer:
-            layered.append([])
-        layered[layer].append(name)
+        for dependency in self.dependencies_of(name):
+            layer = max(layer, self.layer_of.get(dependency, -1) + 1)
 
+        if len(self._layered) == layer:
+            self._layered.append([])
+        self._layered[layer].append(name)
+        self.layer_of[name] = layer
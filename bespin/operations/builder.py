@@ -1,3 +1,4 @@
+from bespin.option_spec.artifact_objs import DIGEST_METADATA
 from bespin.errors import MissingDependency
 from bespin.layers import Layers
 from bespin import helpers as hp
@@ -10,15 +11,16 @@ class Builder(object):
     def sanity_check(self, stack, stacks, ignore_deps=False, checked=None):
         """Perform sanity check on this stack and all it's dependencies"""
         checked = [] if checked is None else checked
-        if stack.stack_name in checked:
+        resolved = stack.resolved
+        if resolved.stack_name in checked:
             return
 
         log.info("Sanity checking %s", stack.key_name)
         stack.sanity_check()
-        checked.append(stack.stack_name)
+        checked.append(resolved.stack_name)
 
         if not ignore_deps and not stack.ignore_deps:
-            for dependency in stack.dependencies(stacks):
+            for dependency in resolved.dependencies:
                 if dependency not in stacks:
                     raise MissingDependency("Couldn't find dependency stack!", dependency=dependency)
                 self.sanity_check(stacks[dependency], stacks, ignore_deps, checked)
@@ -55,6 +57,33 @@ class Builder(object):
 
             # Gather our environment variables
             environment = dict(env.pair for env in stack.build_env)
+            archive_options = dict(
+                  compression_level = artifact.compression_level
+                , compression_threads = artifact.compression_threads
+                , reproducible = artifact.reproducible
+                )
+            s3_location = artifact.upload_to.format(**environment)
+
+            # Skip artifacts that were already uploaded from the same inputs
+            digest = artifact.digest(environment)
+            metadata = None if digest is None else {DIGEST_METADATA: digest}
+            if digest is not None and not stack.bespin.dry_run and not stack.bespin.ignore_fingerprint:
+                existing = stack.s3.object_metadata(s3_location)
+                if existing and existing.get(DIGEST_METADATA) == digest:
+                    log.info("Artifact is unchanged, not making it again\tartifact=%s\tlocation=%s\tdigest=%s", key, s3_location, digest)
+                    continue
+
+            # Upload the tar as we make it
+            if artifact.stream_upload and artifact.archive_format != "zip" and not stack.bespin.dry_run:
+                with stack.s3.multipart_upload(s3_location, metadata=metadata) as upload:
+                    hp.generate_archive_file(upload, artifact.commands + artifact.paths + artifact.files
+                        , environment=environment
+                        , compression=artifact.compression_type
+                        , stream=True
+                        , **archive_options
+                        )
+                log.info("Finished generating and uploading artifact: {0}".format(key))
+                continue
 
             # Create a temporary file to tar to
             with hp.a_temp_file() as temp_tar_file:
@@ -63,15 +92,15 @@ class Builder(object):
                     , environment=environment
                     , compression=artifact.compression_type
                     , archive_format=artifact.archive_format
+                    , **archive_options
                     )
                 log.info("Finished generating artifact: {0}".format(key))
 
                 # Upload the artifact
-                s3_location = artifact.upload_to.format(**environment)
                 if stack.bespin.dry_run:
                     log.info("DRYRUN: Would upload tar file to %s", s3_location)
                 else:
-                    stack.s3.upload_file_to_s3(temp_tar_file.name, s3_location)
+                    stack.s3.upload_file_to_s3(temp_tar_file.name, s3_location, metadata=metadata)
 
     def clean_old_artifacts(self, stack):
         """Clean up any old artifacts"""
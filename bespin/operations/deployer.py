@@ -1,8 +1,12 @@
-from bespin.errors import NoSuchStack, BespinError
+from bespin.errors import NoSuchStack, BespinError, FailedStacks
 from bespin.operations.builder import Builder
+from bespin.scheduler import Scheduler
+from bespin import helpers as hp
 from bespin import VERSION
 
 from input_algorithms.spec_base import NotSpecified
+from contextlib import contextmanager
+from collections import OrderedDict
 from datetime import datetime
 import logging
 import time
@@ -13,6 +17,118 @@ import os
 log = logging.getLogger("bespin.operations.deployer")
 
 class Deployer(object):
+    def deploy_stacks(self, wanted, stacks, max_parallel=1, continue_on_error=False):
+        """
+        Deploy each of the wanted stacks with their dependencies
+
+        If max_parallel is more than one then stacks are built at the same time
+        as soon as the stacks they need are finished.
+        """
+        if max_parallel > 1:
+            return self.deploy_in_parallel(wanted, stacks, max_parallel, continue_on_error=continue_on_error)
+
+        made = []
+        checked = []
+        for stack in wanted:
+            self.deploy_stack(stack, stacks, made=made, checked=checked)
+
+    def deploy_in_parallel(self, wanted, stacks, max_parallel, continue_on_error=False):
+        """
+        Deploy the same stacks as deploy_stack would for each wanted stack
+
+        Each stack is started as soon as the stacks it needs are deployed, with
+        no more than max_parallel stacks being built at once.
+
+        By default we stop starting stacks after the first failure. With
+        continue_on_error we keep going with any stack that doesn't need a
+        failed stack and complain about all the failures at the end.
+        """
+        start = datetime.utcnow()
+
+        checked = []
+        for stack in wanted:
+            Builder().sanity_check(stack, stacks, checked=checked)
+
+        graph = self.deployment_graph(wanted, stacks)
+        scheduler = Scheduler(graph)
+        for name in scheduler.order:
+            log.info("Will deploy %s\tneeds=%s", name, sorted(graph[name]))
+
+        sent_by = self.sent_by()
+        for stack in wanted:
+            self.notify_stackdriver(stack, "Deploying cloudformation", sent_by)
+
+        with self.shared_snapshot(wanted):
+            results = scheduler.run(lambda name: self.make_stack(stacks[name], start), max_parallel, stop_on_error=not continue_on_error)
+
+        errors = [error for error in results.values() if error is not None]
+        if errors:
+            failed = [name for name, error in results.items() if error is not None]
+            not_made = [name for name in scheduler.order if name not in results]
+            raise FailedStacks(failed=failed, not_made=not_made, _errors=errors)
+
+        for stack in wanted:
+            self.notify_stackdriver(stack, "Finished cloudformation", sent_by)
+
+    @contextmanager
+    def shared_snapshot(self, wanted):
+        """Let the stacks we deploy at the same time share one description of every stack"""
+        if not wanted:
+            yield
+            return
+
+        with wanted[0].bespin.credentials.stack_snapshot.shared():
+            yield
+
+    def deployment_graph(self, wanted, stacks):
+        """
+        Return {name: set(names that must be built first)} for the stacks that
+        deploy_stack would make for each of the wanted stacks
+        """
+        graph = OrderedDict()
+
+        def add(stack, ignore_deps):
+            name = stack.key_name
+            if name in graph:
+                return
+
+            if name not in stacks:
+                raise NoSuchStack(looking_for=name, available=stacks.keys())
+            graph[name] = set()
+
+            if not ignore_deps and not stack.ignore_deps:
+                for dependency in stack.resolved.dependencies:
+                    add(stacks[dependency], True)
+                    graph[name].add(dependency)
+
+            for dependency in stack.build_after:
+                add(stacks[dependency], True)
+                graph[dependency].add(name)
+
+        for stack in wanted:
+            add(stack, False)
+        return graph
+
+    def make_stack(self, stack, start):
+        """Build a single stack and then do what deploy_stack does after it's made"""
+        log.info("Making stack for '%s' (%s)", stack.name, stack.resolved.stack_name)
+        self.build_stack(stack)
+
+        if stack.artifact_retention_after_deployment:
+            Builder().clean_old_artifacts(stack)
+
+        self.confirm_deployment(stack, start)
+
+    def sent_by(self):
+        return "bespin=={0}({1})".format(VERSION, os.environ.get("USER", "<unknown_user>"))
+
+    def notify_stackdriver(self, stack, message, sent_by):
+        """Create a stackdriver event for this stack if it wants one"""
+        if stack.notify_stackdriver:
+            if stack.stackdriver is NotSpecified:
+                raise BespinError("Need to specify stackdriver options when specifying notify_stackdriver")
+            stack.stackdriver.create_event("{0}-{1} - {2}".format(stack.resolved.stack_name, stack.stackdriver.format_version(stack.env), message), sent_by)
+
     def deploy_stack(self, stack, stacks, made=None, ignore_deps=False, checked=None, start=None, is_dependency=False):
         """Deploy a stack and all it's dependencies"""
         if start is None:
@@ -29,26 +145,24 @@ class Deployer(object):
         if stack.name not in stacks:
             raise NoSuchStack(looking_for=stack.name, available=stacks.keys())
 
-        sent_by = "bespin=={0}({1})".format(VERSION, os.environ.get("USER", "<unknown_user>"))
-        if not is_dependency and stack.notify_stackdriver:
-            if stack.stackdriver is NotSpecified:
-                raise BespinError("Need to specify stackdriver options when specifying notify_stackdriver")
-            stack.stackdriver.create_event("{0}-{1} - Deploying cloudformation".format(stack.stack_name, stack.stackdriver.format_version(stack.env)), sent_by)
+        sent_by = self.sent_by()
+        if not is_dependency:
+            self.notify_stackdriver(stack, "Deploying cloudformation", sent_by)
 
         if not ignore_deps and not stack.ignore_deps:
-            for dependency in stack.dependencies(stacks):
+            for dependency in stack.resolved.dependencies:
                 self.deploy_stack(stacks[dependency], stacks, made=made, ignore_deps=True, checked=checked, start=start, is_dependency=True)
 
         # Should have all our dependencies now
-        log.info("Making stack for '%s' (%s)", stack.name, stack.stack_name)
+        log.info("Making stack for '%s' (%s)", stack.name, stack.resolved.stack_name)
         self.build_stack(stack)
 
         if any(stack.build_after):
             for dependency in stack.build_after:
                 self.deploy_stack(stacks[dependency], stacks, made=made, ignore_deps=True, checked=checked, start=start, is_dependency=True)
 
-        if not is_dependency and stack.notify_stackdriver:
-            stack.stackdriver.create_event("{0}-{1} - Finished cloudformation".format(stack.stack_name, stack.stackdriver.format_version(stack.env)), sent_by)
+        if not is_dependency:
+            self.notify_stackdriver(stack, "Finished cloudformation", sent_by)
 
         if stack.artifact_retention_after_deployment:
             Builder().clean_old_artifacts(stack)
@@ -60,9 +174,9 @@ class Deployer(object):
         if stack.suspend_actions and stack.cloudformation.status.exists:
             self.suspend_cloudformation_actions(stack)
 
-        sys.stdout.write("Building - {0}\n".format(stack.stack_name))
-        sys.stdout.write(json.dumps(stack.redacted_params_obj, indent=4))
-        sys.stdout.write("\n")
+        # Written in one go so stacks being built at the same time don't interleave
+        resolved = stack.resolved
+        sys.stdout.write(hp.prefixed("Building - {0}\n{1}\n".format(resolved.stack_name, json.dumps(resolved.redacted_params, indent=4))))
         sys.stdout.flush()
 
         skip = False
@@ -88,6 +202,9 @@ class Deployer(object):
             stack.cloudformation.wait(timeout=stack.build_timeout)
 
         stack.cloudformation.reset()
+        stack.bespin.credentials.forget_outputs(resolved.stack_name)
+        if changed:
+            stack.remember_fingerprint()
 
         if stack.suspend_actions:
             self.resume_cloudformation_actions(stack)
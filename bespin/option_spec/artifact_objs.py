@@ -5,13 +5,26 @@ from bespin import helpers as hp
 from input_algorithms.spec_base import NotSpecified
 from input_algorithms.dictobj import dictobj
 
+import hashlib
 import logging
 import shutil
+import json
 import sys
 import os
 
 log = logging.getLogger("bespin.option_spec.artifact_objs")
 
+# The s3 metadata key we store the digest of an artifact's inputs under
+DIGEST_METADATA = "bespin-digest"
+
+def file_digest(path):
+    """Return the sha256 of the contents of this file"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fle:
+        for chunk in iter(lambda: fle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 class ArtifactCollection(dictobj):
     fields = ['artifacts']
 
@@ -65,10 +78,53 @@ class Artifact(dictobj):
               .. note:: These only get purged if the stack has ``artifact_retention_after_deployment`` set
                 to true or if the ``clean_old_artifacts`` task is run
           """
-        , "compression_type": "The compression to use on the artifact"
+        , "compression_type": "The compression to use on the artifact (gz, xz, zstd)"
+        , "compression_level": "The level of compression to use"
+        , "compression_threads": """
+              The number of threads to compress gz, zstd and zip artifacts with.
+              Gzip is compressed in blocks across these threads into a multi
+              member gzip, zip files have their members deflated across them and
+              zstd uses every cpu by default
+          """
         , "archive_format": "The archive file format to use on the artifact (tar, zip)"
+        , "reproducible": """
+              Make the same bytes every time the artifact is made from the same
+              files, by giving every file in the archive the same date, owner
+              and either 0755 or 0644 permissions
+          """
+        , "stream_upload": """
+              Upload a tar artifact to s3 in parts while it's being made rather
+              than making it in a temporary file first
+          """
         }
 
+    def digest(self, environment):
+        """
+        Return a sha256 of everything that goes into making this artifact,
+        including the options that change the bytes of the archive
+
+        Or None if we can't know what goes into it without making it, which is
+        the case for files made by tasks.
+        """
+        inputs = {
+              "environment": environment
+            , "compression_type": self.compression_type
+            , "compression_level": self.compression_level
+            , "compression_threads": self.compression_threads
+            , "reproducible": self.reproducible
+            , "archive_format": self.archive_format
+            , "contents": []
+            }
+
+        for path_spec in self.commands + self.paths + self.files:
+            contents = path_spec.digest_inputs(environment)
+            if contents is None:
+                return None
+            inputs["contents"].append(contents)
+
+        dumped = json.dumps(inputs, sort_keys=True, default=repr)
+        return hashlib.sha256(dumped.encode("utf-8")).hexdigest()
+
 class ArtifactPath(dictobj):
     fields = ["host_path", "artifact_path", ("stdout", sys.stdout)]
 
@@ -83,8 +139,16 @@ class ArtifactPath(dictobj):
             self.stdout.flush()
             tar.add(full_path, tar_path)
 
+    def digest_inputs(self, environment):
+        """Return [[tar_path, sha256 of the file, mode, link target], ...] for the files we add"""
+        inputs = []
+        for full_path, tar_path in self.files(environment):
+            link = os.readlink(full_path) if os.path.islink(full_path) else None
+            inputs.append([tar_path, file_digest(full_path), os.lstat(full_path).st_mode, link])
+        return sorted(inputs)
+
     def files(self, environment, prefix_path=None):
-        """Iterate over the files in our host_path and yield (full_path, tar_path)"""
+        """Iterate over the files in our host_path in sorted order and yield (full_path, tar_path)"""
         host_path = self.host_path
         prefix_path = "/" if prefix_path is None else prefix_path
         while host_path and host_path.startswith("/"):
@@ -101,7 +165,8 @@ class ArtifactPath(dictobj):
             return
 
         for root, dirs, files in os.walk(host_path, followlinks=True):
-            for f in files:
+            dirs.sort()
+            for f in sorted(files):
                 file_full_path = os.path.abspath(os.path.join(root, f))
                 file_tar_path = file_full_path.replace(os.path.normpath(host_path), artifact_path, 1)
                 yield file_full_path, file_tar_path
@@ -109,6 +174,14 @@ class ArtifactPath(dictobj):
 class ArtifactFile(dictobj):
     fields = ["content", "path", "task", "task_runner", ("stdout", sys.stdout)]
 
+    def digest_inputs(self, environment):
+        """Return [path, content] or None if the content comes from a task"""
+        if self.content is NotSpecified:
+            return None
+        if getattr(self, "_no_more_formatting", False):
+            return [self.path, self.content]
+        return [self.path, self.content.format(**environment)]
+
     def add_to_tar(self, tar, environment=None):
         """Add this file to the tar"""
         if environment is None:
@@ -145,6 +218,15 @@ class ArtifactCommand(dictobj):
             self.do_command(command_root, environment)
             self.do_copy_into_tar(command_root, environment, tar)
 
+    def digest_inputs(self, environment):
+        """Return what we copy, how we change it and the commands we run on it"""
+        return {
+              "copy": [path.digest_inputs(environment) for path in self.copy]
+            , "modify": dict((key, [append.format(**environment) for append in options.get("append", [])]) for key, options in self.modify.items())
+            , "command": [cmd.format(**environment) for cmd in self.command]
+            , "add_into_tar": [[path.host_path, path.artifact_path] for path in self.add_into_tar]
+            }
+
     def do_copy_into_tar(self, into, environment, tar):
         for path in self.add_into_tar:
             for full_path, tar_path in path.files(environment, prefix_path=into):
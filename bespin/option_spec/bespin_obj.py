@@ -13,6 +13,30 @@ class Bespin(dictobj):
       , "config": "Holds a file object to the specified Bespin configuration file"
       , "extra": "Holds extra arguments after a -- when executed from the command line"
       , "dry_run": "Don't run any destructive or modification amazon requests"
+      , "max_parallel": "The number of stacks the deploy and validate_templates tasks may work on at the same time. Set by ``--max-parallel``"
+      , "cache_passwords": """
+            Keep passwords we decrypt with KMS in an encrypted cache in
+            ``~/.cache/bespin`` for an hour so that running bespin again doesn't
+            decrypt them again. Set by ``--cache-passwords``
+        """
+      , "continue_on_error": """
+            When deploying more than one stack at a time, keep deploying the stacks
+            that don't need a stack that failed. Set by ``--continue-on-error``
+        """
+      , "ignore_fingerprint": """
+            Update stacks even when the fingerprint of what we would send to
+            cloudformation matches the one on the deployed stack, and publish
+            artifacts even when they were already made from the same inputs. Set
+            by ``--ignore-fingerprint``
+        """
+      , "no_cache": """
+            Don't use or update the caches in ``~/.cache/bespin``, like the caches
+            of stack outputs and fingerprints. Set by ``--no-cache``
+        """
+      , "revalidate": """
+            Ask amazon to validate templates even if we have already validated
+            exactly the same template in this region. Set by ``--revalidate``
+        """
       , "assume_role": """
             An iam role to assume into before doing any amazon requests.
 
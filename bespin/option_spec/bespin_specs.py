@@ -331,8 +331,12 @@ class BespinSpec(object):
 
             , artifacts = container_spec(artifact_objs.ArtifactCollection, dictof(string_spec(), create_spec(artifact_objs.Artifact
                 , not_created_here = defaulted(boolean(), False)
-                , compression_type = string_choice_spec(["gz", "xz"])
+                , compression_type = string_choice_spec(["gz", "xz", "zstd"])
+                , compression_level = defaulted(integer_spec(), None)
+                , compression_threads = defaulted(integer_spec(), None)
                 , archive_format = defaulted(string_choice_spec(["tar", "zip"]), "tar")
+                , reproducible = defaulted(boolean(), False)
+                , stream_upload = defaulted(boolean(), False)
                 , history_length = integer_spec()
                 , cleanup_prefix = optional_spec(string_spec())
                 , upload_to = formatted(string_spec(), formatter=MergedOptionStringFormatter)
@@ -404,6 +408,12 @@ class BespinSpec(object):
             , extra = defaulted(string_spec(), "")
             , dry_run = defaulted(boolean(), False)
             , flat = defaulted(boolean(), False)
+            , max_parallel = defaulted(integer_spec(), 1)
+            , cache_passwords = defaulted(boolean(), False)
+            , continue_on_error = defaulted(boolean(), False)
+            , ignore_fingerprint = defaulted(boolean(), False)
+            , no_cache = defaulted(boolean(), False)
+            , revalidate = defaulted(boolean(), False)
             , environment = optional_spec(string_spec())
 
             , no_assume_role = defaulted(formatted_boolean, False)
@@ -3,7 +3,6 @@ from bespin import helpers as hp
 
 from input_algorithms.spec_base import NotSpecified
 from input_algorithms.dictobj import dictobj
-import requests
 import fnmatch
 import logging
 
@@ -18,6 +17,7 @@ class UrlChecker(dictobj):
         }
 
     def wait(self, environment):
+        import requests
         endpoint = self.endpoint().resolve()
         while endpoint.endswith("/"):
             endpoint = endpoint[:-1]
@@ -4,7 +4,6 @@ from bespin.errors import BadNetScaler
 from input_algorithms.spec_base import Spec, dictof, listof, string_spec, container_spec, match_spec, overridden, formatted, set_options, any_spec, optional_spec
 from input_algorithms.spec_base import NotSpecified
 from input_algorithms.dictobj import dictobj
-import requests
 import logging
 import json
 import six
@@ -389,6 +388,7 @@ class NetScaler(dictobj):
 
     def interact(self, method, url, payload=None, content_type=None):
         """interact with the netscaler"""
+        import requests
         try:
             data = None
             if payload:
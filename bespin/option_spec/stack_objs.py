@@ -1,17 +1,14 @@
 from bespin.errors import MissingOutput, BadOption, BadStack, BadJson, BespinError, BadDnsSwitch
-from bespin.amazon.cloudformation_yaml import CloudformationYamlLoader
+from bespin.amazon import cloudformation_yaml
 from bespin.errors import StackDoesntExist, MissingSSHKey
-from bespin.operations.ssh import RatticSSHKeys
+from bespin.substitution import Substitution, placeholder_regex
 from bespin.helpers import memoized_property
-from bespin import helpers as hp
 
-from ultra_rest_client import RestApiClient as UltraRestApiClient
 from input_algorithms.spec_base import NotSpecified
-from dnslib import DNSRecord, DNSQuestion, QTYPE
 from input_algorithms.dictobj import dictobj
-from pyrelic import Client as NewrelicClient
+import threading
 import binascii
-import requests
+import hashlib
 import logging
 import socket
 import base64
@@ -19,7 +16,6 @@ import shlex
 import json
 import time
 import stat
-import yaml
 import six
 import os
 import re
@@ -192,6 +188,10 @@ class Stack(dictobj):
     def cloudformation(self):
         return self.bespin.credentials.cloudformation(self.stack_name)
 
+    @property
+    def outputs(self):
+        return self.bespin.credentials.stack_outputs(self.stack_name)
+
     @memoized_property
     def ec2(self):
         return self.bespin.credentials.ec2
@@ -207,7 +207,7 @@ class Stack(dictobj):
     @memoized_property
     def auto_scaling_group(self):
         asg_physical_id = self.cloudformation.map_logical_to_physical_resource_id(self.auto_scaling_group_name)
-        return self.ec2.autoscale.get_all_groups(names=[asg_physical_id])[0]
+        return self.ec2.autoscaling_group(asg_physical_id)
 
     @memoized_property
     def s3(self):
@@ -243,30 +243,46 @@ class Stack(dictobj):
 
     def params_json_raw_vars_replaced(self):
         params = self.params_json_raw
+        if not placeholder_regex.search(params):
+            return params
+
         environment = dict([env.pair for env in self.env])
 
-        def replace_vars(s):
-            for thing in (self.nested_var_items(), [env.pair for env in self.env]):
-                for var, value in thing:
-                    key = "XXX_{0}_XXX".format(var.upper())
-                    if key in s:
-                        if not isinstance(value, six.string_types):
-                            value = value.resolve()
-                        if callable(value):
-                            value = value()
-                        s = s.replace(key, value.format(**environment))
-            return s
-
-        varsre = re.compile("XXX_([A-Z0-9_]+)_XXX")
-        matches = lambda p: varsre.findall(p)
-        while varsre.search(params):
-            matches_before = matches(params)
-            params = replace_vars(params)
-
-            if matches_before == matches(params):
-                break
+        def getter(value):
+            def get():
+                val = value
+                if not isinstance(val, six.string_types):
+                    val = val.resolve()
+                if callable(val):
+                    val = val()
+                return val.format(**environment)
+            return get
+
+        getters = {}
+        remote = set()
+        for thing in (self.nested_var_items(), [env.pair for env in self.env]):
+            for var, value in thing:
+                name = var.upper()
+                if name not in getters:
+                    getters[name] = getter(value)
+                    if not isinstance(value, six.string_types):
+                        remote.add(name)
+
+        substitution = Substitution(getters)
+        substitution.prefetch(params, remote, max_parallel=self.parallel_lookups)
+        return substitution.replace(params)
 
-        return params
+    @property
+    def parallel_lookups(self):
+        """
+        How many variables from other stacks we look up at the same time
+
+        This is our share of the cloudformation burst between the stacks we may
+        be deploying at the same time
+        """
+        from bespin.amazon.throttling import limiter
+        rate, burst = limiter.limits_for("cloudformation")
+        return max(1, burst // max(1, self.bespin.max_parallel))
 
     @property
     def params_json_obj(self):
@@ -283,8 +299,11 @@ class Stack(dictobj):
 
     @property
     def redacted_params_obj(self):
+        return self.redact_params(self.params_json_obj)
+
+    def redact_params(self, params_obj):
         params = []
-        for p in self.params_json_obj:
+        for p in params_obj:
             key = p["ParameterKey"]
             val = p["ParameterValue"]
             if key in self.sensitive_params:
@@ -292,33 +311,72 @@ class Stack(dictobj):
             params.append({"ParameterKey": key, "ParameterValue": val})
         return params
 
-    def create_or_update(self):
-        """Create or update the stack, return True if the stack actually changed"""
-        log.info("Creating or updating the stack (%s)", self.stack_name)
-        status = self.cloudformation.wait(may_not_exist=True)
+    @property
+    def tags_dict(self):
         tags = self.tags or None
-        role = self.bespin.credentials.account_role_arn(self.role_name)
         if tags and type(tags) is not dict and hasattr(self.tags, "as_dict"):
             tags = tags.as_dict()
+        return tags
+
+    @property
+    def role_arn(self):
+        if not self.role_name:
+            return self.role_name
+        self.bespin.set_credentials()
+        return self.bespin.credentials.account_role_arn(self.role_name)
+
+    @memoized_property
+    def resolved(self):
+        """The values we send to cloudformation for this deploy of the stack"""
+        return ResolvedStack(self)
+
+    def fingerprint(self, resolved):
+        """Return a hash of everything we send to cloudformation when we deploy this stack"""
+        everything = {
+              "template": resolved.template
+            , "params": resolved.params
+            , "tags": resolved.tags
+            , "policy": resolved.policy
+            , "role": resolved.role
+            , "termination_protection": self.termination_protection
+            }
+        return hashlib.sha256(json.dumps(everything, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def remember_fingerprint(self):
+        """Remember the fingerprint of this deploy so the next one can skip the stack if nothing changed"""
+        self.bespin.credentials.remember_fingerprint(self.cloudformation, self.fingerprint(self.resolved))
+
+    def create_or_update(self):
+        """Create or update the stack, return True if the stack actually changed"""
+        resolved = self.resolved
+        log.info("Creating or updating the stack (%s)", resolved.stack_name)
+        status = self.cloudformation.wait(may_not_exist=True)
+
+        args = (resolved.template, resolved.params, resolved.tags, resolved.policy, resolved.role, self.termination_protection)
 
         if not status.exists:
             log.info("No existing stack, making one now")
             if self.bespin.dry_run:
                 log.info("DRYRUN: Would create stack")
                 log.info("Would use following stack:")
-                print(self.dumped_stack_obj)
+                print(resolved.template)
             else:
-                return self.cloudformation.create(self.dumped_stack_obj, self.params_json_obj, tags, self.dumped_policy_obj, role, self.termination_protection)
+                return self.cloudformation.create(*args)
         elif status.complete:
+            fingerprint = self.fingerprint(resolved)
+            if not self.bespin.ignore_fingerprint and self.bespin.credentials.deployed_fingerprint(self.cloudformation) == fingerprint:
+                log.info("Stack hasn't changed since it was last deployed, not updating (%s)\tfingerprint=%s", resolved.stack_name, fingerprint)
+                return False
+
             log.info("Found existing stack, doing an update")
             if self.bespin.dry_run:
                 log.info("DRYRUN: Would update stack")
                 log.info("Would use following stack:")
-                print(self.dumped_stack_obj)
+                print(resolved.template)
             else:
-                return self.cloudformation.update(self.dumped_stack_obj, self.params_json_obj, tags, self.dumped_policy_obj, role, self.termination_protection)
+                return self.cloudformation.update(*args)
         else:
-            raise BadStack("Stack could not be updated", name=self.stack_name, status=status.name)
+            raise BadStack("Stack could not be updated", name=resolved.stack_name, status=status.name)
 
         return False
 
@@ -334,17 +392,14 @@ class Stack(dictobj):
 
     def validate_template(self):
         """ Validate stack template against CloudFormation """
-        with hp.a_temp_file() as fle:
-            with open(fle.name, "w") as fle:
-                fle.write(self.dumped_stack_obj)
-            return self.cloudformation.validate_template(fle.name)
+        return self.cloudformation.validate_template_body(self.dumped_stack_obj, revalidate=self.bespin.revalidate)
 
     @memoized_property
     def template_outputs(self):
         if self.stack_json is not NotSpecified:
             template = self.stack_json
         else:
-            template = yaml.load(self.stack_yaml, Loader=CloudformationYamlLoader)
+            template = cloudformation_yaml.load(self.stack_yaml)
         return template.get('Outputs', {})
 
     def validate_template_params(self):
@@ -389,6 +444,63 @@ class Stack(dictobj):
 
         self.validate_template_params()
 
+class ResolvedStack(object):
+    """
+    The values of a stack for one deploy
+
+    Each value is worked out the first time it's asked for and then stays the
+    same for the rest of the deploy. Nothing is worked out before it's needed,
+    so the params aren't resolved until the stacks they get outputs from have
+    been deployed.
+    """
+    def __init__(self, stack):
+        self.stack = stack
+        self.values = {}
+        self.lock = threading.RLock()
+
+    def value(self, name, getter):
+        with self.lock:
+            if name not in self.values:
+                self.values[name] = getter()
+            return self.values[name]
+
+    @property
+    def key_name(self):
+        return self.stack.key_name
+
+    @property
+    def stack_name(self):
+        return self.value("stack_name", lambda: self.stack.stack_name)
+
+    @property
+    def dependencies(self):
+        """Tuple of the key names of the stacks this stack needs"""
+        return self.value("dependencies", lambda: tuple(self.stack.dependencies(None)))
+
+    @property
+    def template(self):
+        return self.value("template", lambda: self.stack.dumped_stack_obj)
+
+    @property
+    def params(self):
+        return self.value("params", lambda: self.stack.params_json_obj)
+
+    @property
+    def redacted_params(self):
+        return self.value("redacted_params", lambda: self.stack.redact_params(self.params))
+
+    @property
+    def tags(self):
+        return self.value("tags", lambda: self.stack.tags_dict)
+
+    @property
+    def policy(self):
+        return self.value("policy", lambda: self.stack.dumped_policy_obj)
+
+    @property
+    def role(self):
+        return self.value("role", lambda: self.stack.role_arn)
+
 class Environment(dictobj):
     fields = {
           "account_id": "AWS account id for this environment"
@@ -428,6 +540,7 @@ class Stackdriver(dictobj):
             , "level": "INFO"
             , "event_epoch": time.time()
             }
+        import requests
         res = requests.post(url, headers=headers, data=json.dumps(event))
         if res.status_code != 201 or res.content != b'Published':
             raise BespinError("Failed to send stackdriver event", status_code=res.status_code, error=res.content)
@@ -460,11 +573,9 @@ class DynamicVariable(dictobj):
 
         after_deployment = []
         if isinstance(self.stack, six.string_types):
-            cloudformation = self.bespin.credentials.cloudformation(self.stack)
-            cloudformation.wait()
-            outputs = cloudformation.outputs
+            outputs = self.bespin.credentials.stack_outputs(self.stack)
         else:
-            outputs = self.stack.cloudformation.outputs
+            outputs = self.stack.outputs
             after_deployment = self.stack.template_outputs.keys()
 
         if self.output not in outputs:
@@ -533,6 +644,7 @@ class SSH(dictobj):
         if self.storage_type == "url":
             return type("Storage", (object, ), {"retrieve": lambda *args: False})()
         else:
+            from bespin.operations.ssh import RatticSSHKeys
             return RatticSSHKeys(self.storage_host
                 , self.bastion_key_location, self.bastion_key_path
                 , self.instance_key_location, self.instance_key_path
@@ -677,6 +789,7 @@ class NewRelic(dictobj):
             api_key = self.api_key
             if callable(api_key):
                 api_key = api_key()
+            from pyrelic import Client as NewrelicClient
             self._client = NewrelicClient(account_id=self.account_id, api_key=api_key)
         return self._client
 
@@ -715,6 +828,7 @@ class UltraDNSProvider(dictobj):
             password = self.password
             if callable(password):
                 password = password()
+            from ultra_rest_client import RestApiClient as UltraRestApiClient
             self._client = UltraRestApiClient(self.username, password, False, "restapi.ultradns.com")
         return self._client
 
@@ -801,6 +915,7 @@ class UltraDNSSite(dictobj):
                 log.info("Current value is %s", list(set(found)))
 
         if rtype == "CNAME":
+            from dnslib import DNSRecord, DNSQuestion, QTYPE
             answer = DNSRecord.parse(DNSRecord(q=DNSQuestion(self.domain, QTYPE.CNAME)).send("8.8.8.8", 53)).short()
             if not answer:
                 raise BespinError("couldn't resolve the domain", domain=self.domain)
@@ -5,7 +5,7 @@ Tasks contain a reference to the functionality it provides (in ``bespin.actions`
 as well as options that are used to override those in the stack it's attached to.
 """
 
-from bespin.amazon.credentials import Credentials
+from bespin.cache import DiskCache, EncryptedDiskCache
 from bespin.errors import BadOption
 
 from input_algorithms.spec_base import NotSpecified
@@ -75,6 +75,8 @@ class Task(dictobj):
                 return
             info["done"] = True
 
+            from bespin.amazon.credentials import Credentials
+
             environment = configuration["bespin"].environment
             if not environment:
                 raise BadOption("Please specify an environment", available=list(configuration["environments"].keys()))
@@ -87,10 +89,22 @@ class Task(dictobj):
                 no_assume_role = self.options["no_assume_role"]
             assume_role = NotSpecified if no_assume_role else configuration["bespin"].assume_role
 
+            outputs_cache = validation_cache = passwords_cache = fingerprints_cache = None
+            if not configuration["bespin"].no_cache:
+                outputs_cache = DiskCache("outputs")
+                validation_cache = DiskCache("validated_templates")
+                fingerprints_cache = DiskCache("fingerprints")
+                if configuration["bespin"].cache_passwords:
+                    passwords_cache = EncryptedDiskCache("passwords")
+
             credentials = Credentials(
                   region
                 , configuration["environments"][environment].account_id
                 , assume_role
+                , outputs_cache = outputs_cache
+                , validation_cache = validation_cache
+                , passwords_cache = passwords_cache
+                , fingerprints_cache = fingerprints_cache
                 )
             bespin.credentials = credentials
         bespin.set_credentials = set_credentials
@@ -0,0 +1,147 @@
+from bespin.errors import StackDepCycle
+from bespin import helpers as hp
+
+from collections import OrderedDict
+from six.moves import queue
+import threading
+import logging
+import heapq
+
+log = logging.getLogger("bespin.scheduler")
+
+class Scheduler(object):
+    """
+    Used to run something for many stacks at the same time whilst respecting
+    the order they must happen in.
+
+    Usage::
+
+        scheduler = Scheduler({"app": set(["db", "network"]), "db": set(["network"]), "network": set(), "dns": set()})
+        results = scheduler.run(action, max_parallel=2)
+
+    Where the graph is ``{name: set(names that must finish first)}``.
+
+    Each stack is started as soon as everything it needs has finished rather
+    than waiting for a whole layer of stacks. When more stacks are ready than
+    we may run at once, the stacks with the longest chain of stacks waiting on
+    them are started first.
+
+    Cyclic dependencies will be complained about.
+    """
+    def __init__(self, graph):
+        self.graph = graph
+
+    @hp.memoized_property
+    def dependents(self):
+        """Return {name: set(names that need this one)}"""
+        dependents = dict((name, set()) for name in self.graph)
+        for name, needs in self.graph.items():
+            for need in needs:
+                dependents[need].add(name)
+        return dependents
+
+    @hp.memoized_property
+    def order(self):
+        """Return the names in an order where every stack is after the stacks it needs"""
+        order = []
+        waiting = dict((name, len(needs)) for name, needs in self.graph.items())
+        ready = sorted((name for name, count in waiting.items() if count == 0), reverse=True)
+        while ready:
+            name = ready.pop()
+            order.append(name)
+            for dependent in self.dependents[name]:
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+
+        if len(order) != len(self.graph):
+            raise StackDepCycle(chain=sorted(name for name in self.graph if name not in order))
+        return order
+
+    @hp.memoized_property
+    def critical_paths(self):
+        """Return {name: number of stacks in the longest chain that starts with this one}"""
+        lengths = {}
+        for name in reversed(self.order):
+            lengths[name] = 1 + max([lengths[dependent] for dependent in self.dependents[name]] or [0])
+        return lengths
+
+    def run(self, action, max_parallel=1, stop_on_error=False):
+        """
+        Call ``action(name)`` for every stack with no more than ``max_parallel`` at once
+
+        Each action is run inside ``log_prefix(name)``.
+
+        Return an OrderedDict of ``{name: error}`` for each stack that was
+        started, where error is None if the action didn't raise an exception.
+
+        Stacks that need a stack that failed are never started. If
+        ``stop_on_error`` is True then no more stacks are started after the
+        first failure.
+        """
+        critical_paths = self.critical_paths
+        waiting = dict((name, set(needs)) for name, needs in self.graph.items())
+
+        ready = []
+        def make_ready(name):
+            heapq.heappush(ready, (-critical_paths[name], name))
+
+        for name in self.order:
+            if not waiting[name]:
+                make_ready(name)
+
+        finished = queue.Queue()
+        def worker(name):
+            failure = None
+            with hp.log_prefix(name):
+                try:
+                    action(name)
+                except Exception as error:
+                    log.exception("Failed to run %s", name)
+                    failure = error
+            finished.put((name, failure))
+
+        results = {}
+        running = set()
+        stopped = False
+        while running or (ready and not stopped):
+            while ready and not stopped and len(running) < max_parallel:
+                _, name = heapq.heappop(ready)
+                running.add(name)
+                thread = threading.Thread(target=worker, args=(name, ))
+                thread.daemon = True
+                thread.start()
+
+            # Get with a timeout so that ctrl-c still gets to the main thread
+            try:
+                name, failure = finished.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            running.remove(name)
+            results[name] = failure
+            if failure is not None:
+                stopped = stopped or stop_on_error
+                for dependent in self.blocked_by(name):
+                    log.error("Not starting %s because it needs %s which failed", dependent, name)
+                    waiting.pop(dependent, None)
+                continue
+
+            for dependent in sorted(self.dependents[name]):
+                if dependent in waiting:
+                    waiting[dependent].discard(name)
+                    if not waiting[dependent]:
+                        make_ready(dependent)
+
+        return OrderedDict((name, results[name]) for name in self.order if name in results)
+
+    def blocked_by(self, name):
+        """Return everything that directly or indirectly needs this stack"""
+        found = set()
+        stack = list(self.dependents[name])
+        while stack:
+            nxt = stack.pop()
+            if nxt not in found:
+                found.add(nxt)
+                stack.extend(self.dependents[nxt])
+        return sorted(found)
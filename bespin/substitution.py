@@ -0,0 +1,89 @@
+"""
+Replacing ``XXX_NAME_XXX`` placeholders with the values of variables
+
+Usage::
+
+    substitution = Substitution({"VPC": lambda: "vpc-123", "SUBNET": lambda: "XXX_VPC_XXX-a"})
+    substitution.replace('{"Vpc": "XXX_VPC_XXX", "Subnet": "XXX_SUBNET_XXX"}')
+
+Each value is only worked out the first time its placeholder is found, and
+placeholders in values are themselves replaced. Placeholders we don't have a
+value for are left alone.
+
+Values that are slow to get, like outputs from other stacks, can be fetched at
+the same time with ``prefetch`` before calling ``replace``.
+"""
+from bespin.errors import VariableCycle
+from bespin import helpers as hp
+
+import re
+
+# Not greedy so that placeholders next to each other are found separately
+placeholder_regex = re.compile("XXX_([A-Z0-9_]+?)_XXX")
+
+class Substitution(object):
+    def __init__(self, getters):
+        self.getters = getters
+        self.raw = {}
+        self.values = {}
+
+    def names_in(self, text):
+        """Return the names of the placeholders in this text that we have values for"""
+        return set(name for name in placeholder_regex.findall(text) if name in self.getters)
+
+    def fetched(self, name):
+        """Return the value for this name before its placeholders are replaced"""
+        if name not in self.raw:
+            self.raw[name] = self.getters[name]()
+        return self.raw[name]
+
+    def prefetch(self, text, remote, max_parallel=1):
+        """
+        Get the values for the names in ``remote`` that text needs, ``max_parallel`` at a time
+
+        We get all the remote values used by text at once, then all the remote
+        values used by those values, and so on until we have everything.
+        Errors from getting a value are raised after all the values in that
+        round have been looked up.
+        """
+        seen = set()
+        wanted = self.names_in(text)
+        while wanted:
+            found = set()
+            lookups = []
+            for name in sorted(wanted):
+                seen.add(name)
+                if name in remote:
+                    lookups.append(name)
+                else:
+                    found |= self.names_in(self.fetched(name))
+
+            jobs = [(name, (lambda name=name: self.fetched(name))) for name in lookups]
+            results = hp.run_concurrently(jobs, max_parallel=max_parallel, log_errors=False)
+            for error in results.values():
+                if error is not None:
+                    raise error
+
+            for name in lookups:
+                found |= self.names_in(self.raw[name])
+            wanted = found - seen
+
+    def replace(self, text):
+        """Return text with all the placeholders we know about replaced in one pass"""
+        return self.replace_in(text, [])
+
+    def replace_in(self, text, chain):
+        def replacement(match):
+            name = match.group(1)
+            if name not in self.getters:
+                return match.group(0)
+            return self.value(name, chain)
+        return placeholder_regex.sub(replacement, text)
+
+    def value(self, name, chain):
+        """Work out the value for this name, complaining if it ends up needing itself"""
+        if name not in self.values:
+            if name in chain:
+                raise VariableCycle(chain=chain[chain.index(name):] + [name])
+            self.values[name] = self.replace_in(self.fetched(name), chain + [name])
+        return self.values[name]
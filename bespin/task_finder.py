@@ -6,6 +6,52 @@ from bespin.actions import available_actions, default_actions
 from bespin.option_spec.task_objs import Task
 from bespin.errors import BadTask
 
+class Tasks(object):
+    """
+    A dictionary of ``{name: Task}`` that only converts the tasks of a stack
+    when one of them is asked for.
+
+    Tasks from stacks override the default tasks, tasks from later stacks
+    override those from earlier stacks and ``overrides`` override everything.
+    """
+    def __init__(self, configuration, defaults, stack_tasks, overrides):
+        self.defaults = defaults
+        self.overrides = overrides
+        self.stack_tasks = stack_tasks
+        self.configuration = configuration
+
+    def __getitem__(self, name):
+        if name in self.overrides:
+            return self.overrides[name]
+        if name in self.stack_tasks:
+            stack = self.stack_tasks[name]
+            path = self.configuration.path(["stacks", stack, "tasks"], joined="stacks.{0}.tasks".format(stack))
+            return self.configuration[path][name]
+        return self.defaults[name]
+
+    def __contains__(self, name):
+        return name in self.overrides or name in self.stack_tasks or name in self.defaults
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
+    def keys(self):
+        return sorted(set(self.defaults) | set(self.stack_tasks) | set(self.overrides))
+
+    def values(self):
+        return [self[name] for name in self.keys()]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
 class TaskFinder(object):
     def __init__(self, collector):
         self.tasks = {}
@@ -24,17 +70,20 @@ class TaskFinder(object):
         return dict((name, Task(action=name, label="Bespin")) for name in default_actions)
 
     def find_tasks(self, overrides):
-        """Find the custom tasks and record the associated stack with each task"""
-        tasks = self.default_tasks()
+        """
+        Find the custom tasks and record the associated stack with each task
+
+        We only look at the names of each stack's tasks here so that we don't
+        convert the tasks of every stack when we only need one of them.
+        """
         configuration = self.collector.configuration
 
+        stack_tasks = {}
+        raw_stacks = configuration.as_dict("stacks")
         for stack in list(configuration["stacks"]):
-            path = configuration.path(["stacks", stack, "tasks"], joined="stacks.{0}.tasks".format(stack))
-            nxt = configuration.get(path, {})
-            tasks.update(nxt)
-
-        if overrides:
-            tasks.update(overrides)
-
-        self.tasks = tasks
+            options = raw_stacks.get(stack)
+            if isinstance(options, dict):
+                for name in options.get("tasks") or {}:
+                    stack_tasks[name] = stack
 
+        self.tasks = Tasks(configuration, self.default_tasks(), stack_tasks, overrides or {})
@@ -30,12 +30,15 @@ setup(
       ]
 
     , extras_require =
-      { "tests":
+      { "zstd": ["zstandard"]
+      , "passwords": ["cryptography"]
+      , "tests":
         [ "noseOfYeti>=1.5.0"
         , "nose"
         , "mock"
         , "moto==1.1.25"
         , "coverage"
+        , "cryptography"
 
         # Need to ensure httpretty is not 0.8.7
         # To prevent an infinite loop in python3 tests
@@ -1,16 +1,20 @@
 # coding: spec
 
-from bespin.amazon.cloudformation import Cloudformation, Status, NONEXISTANT, CREATE_COMPLETE, UPDATE_COMPLETE
-from bespin.errors import StackDoesntExist
+from bespin.amazon.cloudformation import Cloudformation, StackSnapshot, Status, NONEXISTANT, CREATE_COMPLETE, UPDATE_COMPLETE, UPDATE_IN_PROGRESS
+from bespin.errors import StackDoesntExist, BadStack
 
 from tests.helpers import BespinCase
 
 from noseOfYeti.tokeniser.support import noy_sup_setUp
 from moto import mock_cloudformation, mock_sts
 from textwrap import dedent
+import datetime
+import hashlib
 import botocore
 import boto3
+import mock
 import nose
+import pytz
 import os
 
 describe BespinCase, "Status classes":
@@ -186,3 +190,183 @@ describe BespinCase, 'Cloudformation':
         self.assertTrue(cf.description())
         self.assertEqual(cf.outputs['StackId'], orig_stackid)
         self.assertEqual(cf.description()['StackId'], orig_stackid)
+
+describe BespinCase, "Cloudformation events":
+    before_each:
+        self.cf = Cloudformation("example_stack")
+        self.cf.conn = mock.Mock(name="conn")
+        self.start = datetime.datetime(2018, 1, 1, tzinfo=pytz.utc)
+
+    def event(self, num):
+        return { "EventId": "event{0}".format(num), "Timestamp": self.start + datetime.timedelta(seconds=num)
+               , "ResourceType": "AWS::EC2::InternetGateway", "LogicalResourceId": "Test", "ResourceStatus": "UPDATE_COMPLETE"
+               }
+
+    def pages(self, *pages):
+        """Make describe_stack_events return these pages of event numbers, newest first"""
+        def describe_stack_events(StackName, NextToken=None):
+            self.assertEqual(StackName, "example_stack")
+            index = int(NextToken or 0)
+            response = {"StackEvents": [self.event(num) for num in pages[index]]}
+            if index + 1 < len(pages):
+                response["NextToken"] = str(index + 1)
+            return response
+        self.cf.conn.describe_stack_events.side_effect = describe_stack_events
+
+    def ids(self, events):
+        return [event["EventId"] for event in events]
+
+    it "only returns events after since when there is no cursor":
+        self.pages([5, 4, 3], [2, 1])
+        self.assertEqual(self.ids(self.cf.new_events(since=self.start + datetime.timedelta(seconds=3))), ["event4", "event5"])
+        self.assertEqual(len(self.cf.conn.describe_stack_events.mock_calls), 1)
+
+    it "pages until it reaches the cursor and remembers the newest event":
+        self.pages([3, 2, 1])
+        self.assertEqual(self.ids(self.cf.new_events(since=self.start)), ["event1", "event2", "event3"])
+        self.assertEqual(self.cf.event_cursor, ("event3", self.start + datetime.timedelta(seconds=3)))
+
+        self.pages([8, 7], [6, 5], [4, 3], [2, 1])
+        self.assertEqual(self.ids(self.cf.new_events(since=self.start)), ["event4", "event5", "event6", "event7", "event8"])
+        self.assertEqual(len(self.cf.conn.describe_stack_events.mock_calls), 1 + 3)
+        self.assertEqual(self.cf.event_cursor[0], "event8")
+
+        self.pages([8, 7], [6, 5])
+        self.assertEqual(self.cf.new_events(since=self.start), [])
+        self.assertEqual(self.cf.event_cursor[0], "event8")
+
+    it "keeps the cursor between waits":
+        statuses = iter([UPDATE_IN_PROGRESS, UPDATE_IN_PROGRESS, UPDATE_COMPLETE, UPDATE_COMPLETE])
+        self.cf.event_cursor = ("event1", self.start + datetime.timedelta(seconds=1))
+        self.pages([2, 1])
+
+        with mock.patch.object(Cloudformation, "status", property(lambda s: next(statuses))):
+            with mock.patch("bespin.amazon.cloudformation.hp.until", lambda timeout, step: iter([1, 2])):
+                self.assertEqual(self.cf.wait(), UPDATE_COMPLETE)
+        self.assertEqual(self.cf.event_cursor[0], "event2")
+
+describe BespinCase, "StackSnapshot":
+    before_each:
+        self.snapshot = StackSnapshot("us-east-1", ttl=60)
+        self.snapshot.conn = mock.Mock(name="conn")
+        self.snapshot.conn.describe_stacks.side_effect = self.describe_stacks
+        self.stacks = [[{"StackName": "one", "StackStatus": "CREATE_COMPLETE"}], [{"StackName": "two", "StackStatus": "UPDATE_IN_PROGRESS"}]]
+
+    def describe_stacks(self, NextToken=None):
+        index = int(NextToken or 0)
+        response = {"Stacks": self.stacks[index]}
+        if index + 1 < len(self.stacks):
+            response["NextToken"] = str(index + 1)
+        return response
+
+    it "gets every page of stacks once per ttl":
+        self.assertEqual(self.snapshot.description("one")["StackStatus"], "CREATE_COMPLETE")
+        self.assertEqual(self.snapshot.description("two")["StackStatus"], "UPDATE_IN_PROGRESS")
+        self.assertIs(self.snapshot.description("three"), None)
+        self.assertEqual(len(self.snapshot.conn.describe_stacks.mock_calls), 2)
+
+        self.snapshot.refreshed -= 61
+        self.snapshot.description("one")
+        self.assertEqual(len(self.snapshot.conn.describe_stacks.mock_calls), 4)
+
+    it "gets a new snapshot after being invalidated":
+        self.snapshot.description("one")
+        self.snapshot.invalidate()
+        self.stacks = [[{"StackName": "one", "StackStatus": "UPDATE_IN_PROGRESS"}]]
+        self.assertEqual(self.snapshot.description("one")["StackStatus"], "UPDATE_IN_PROGRESS")
+
+    it "is used by Cloudformation for status and outputs":
+        self.stacks[0][0]["Outputs"] = [{"OutputKey": "Thing", "OutputValue": "stuff"}]
+        one = Cloudformation("one", "us-east-1", snapshot=self.snapshot)
+        two = Cloudformation("two", "us-east-1", snapshot=self.snapshot)
+        one.conn = two.conn = mock.Mock(name="conn", spec=[])
+
+        with self.snapshot.shared():
+            self.assertIs(one.status, CREATE_COMPLETE)
+            self.assertIs(two.status, UPDATE_IN_PROGRESS)
+            self.assertEqual(one.outputs, {"Thing": "stuff"})
+        self.assertEqual(len(self.snapshot.conn.describe_stacks.mock_calls), 2)
+
+    it "isn't used by Cloudformation unless it is being shared":
+        one = Cloudformation("one", "us-east-1", snapshot=self.snapshot)
+        one.conn = mock.Mock(name="conn")
+        one.conn.describe_stacks.return_value = {"Stacks": [{"StackName": "one", "StackStatus": "UPDATE_COMPLETE"}]}
+        self.assertIs(one.status, UPDATE_COMPLETE)
+        one.conn.describe_stacks.assert_called_once_with(StackName="one")
+        self.assertEqual(len(self.snapshot.conn.describe_stacks.mock_calls), 0)
+
+    it "asks for the stack itself if it isn't in the snapshot and remembers it isn't there":
+        three = Cloudformation("three", "us-east-1", snapshot=self.snapshot)
+        three.conn = mock.Mock(name="conn")
+        three.conn.describe_stacks.return_value = {"Stacks": [{"StackName": "three", "StackStatus": "CREATE_IN_PROGRESS"}]}
+        with self.snapshot.shared():
+            self.assertEqual(three.description()["StackStatus"], "CREATE_IN_PROGRESS")
+            self.snapshot.refreshed -= 61
+            three.description(force=True)
+        self.assertEqual(three.conn.describe_stacks.mock_calls, [mock.call(StackName="three")] * 2)
+        self.assertEqual(len(self.snapshot.conn.describe_stacks.mock_calls), 2)
+
+    it "sees the new status straight after creating the stack":
+        one = Cloudformation("one", "us-east-1", snapshot=self.snapshot)
+        one.conn = mock.Mock(name="conn")
+        with self.snapshot.shared():
+            self.assertIs(one.status, CREATE_COMPLETE)
+
+            one.create("{}", [])
+            self.stacks = [[{"StackName": "one", "StackStatus": "UPDATE_IN_PROGRESS"}]]
+            self.assertIs(one.status, UPDATE_IN_PROGRESS)
+
+describe BespinCase, "Cloudformation resources":
+    before_each:
+        self.cf = Cloudformation("example_stack")
+        self.cf.conn = mock.Mock(name="conn")
+        self.cf._description = {"StackName": "example_stack", "CreationTime": "created"}
+
+        pages = [
+              {"StackResourceSummaries": [{"LogicalResourceId": "One", "PhysicalResourceId": "one-1"}], "NextToken": "1"}
+            , {"StackResourceSummaries": [{"LogicalResourceId": "Two", "PhysicalResourceId": "two-1"}, {"LogicalResourceId": "Three"}]}
+            ]
+        def list_stack_resources(StackName, NextToken=None):
+            self.assertEqual(StackName, "example_stack")
+            return pages[int(NextToken or 0)]
+        self.cf.conn.list_stack_resources.side_effect = list_stack_resources
+
+    it "gets all the resources once until the stack is updated":
+        self.assertEqual(self.cf.map_logical_to_physical_resource_id("One"), "one-1")
+        self.assertEqual(self.cf.map_logical_to_physical_resource_id("Two"), "two-1")
+        self.assertEqual(len(self.cf.conn.list_stack_resources.mock_calls), 2)
+
+        self.cf._description = {"StackName": "example_stack", "CreationTime": "created", "LastUpdatedTime": "updated"}
+        self.assertEqual(self.cf.map_logical_to_physical_resource_id("One"), "one-1")
+        self.assertEqual(len(self.cf.conn.list_stack_resources.mock_calls), 4)
+
+    it "complains about resources without a physical id":
+        with self.fuzzyAssertRaisesError(BadStack, stack="example_stack", logical_id="Three", available=["One", "Three", "Two"]):
+            self.cf.map_logical_to_physical_resource_id("Three")
+        with self.fuzzyAssertRaisesError(BadStack, logical_id="Four"):
+            self.cf.map_logical_to_physical_resource_id("Four")
+
+describe BespinCase, "Cloudformation validating templates":
+    before_each:
+        self.cache = mock.Mock(name="cache")
+        self.cf = Cloudformation("example_stack", "us-east-1", validation_cache=self.cache)
+        self.cf.conn = mock.Mock(name="conn")
+        self.cf.conn.validate_template.return_value = {"Parameters": [], "ResponseMetadata": {"RequestId": "1"}}
+        self.key = hashlib.sha256("us-east-1\n{}".encode("utf-8")).hexdigest()
+
+    it "uses the cached response for the same template in the same region":
+        self.cache.get.return_value = {"Parameters": [{"ParameterKey": "One"}]}
+        self.assertEqual(self.cf.validate_template_body("{}"), {"Parameters": [{"ParameterKey": "One"}]})
+        self.cache.get.assert_called_once_with(self.key, max_age=Cloudformation.validation_max_age)
+        self.assertEqual(len(self.cf.conn.validate_template.mock_calls), 0)
+
+    it "asks amazon and caches the response when it has to":
+        self.cache.get.return_value = None
+        self.assertEqual(self.cf.validate_template_body("{}"), {"Parameters": []})
+        self.cf.conn.validate_template.assert_called_once_with(TemplateBody="{}")
+        self.cache.set.assert_called_once_with(self.key, {"Parameters": []})
+
+    it "always asks amazon when revalidating":
+        self.assertEqual(self.cf.validate_template_body("{}", revalidate=True), {"Parameters": []})
+        self.assertEqual(len(self.cache.get.mock_calls), 0)
+        self.cf.conn.validate_template.assert_called_once_with(TemplateBody="{}")
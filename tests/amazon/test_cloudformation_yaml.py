@@ -0,0 +1,47 @@
+# coding: spec
+
+from bespin.amazon.cloudformation_yaml import CloudformationYamlLoader, FastCloudformationYamlLoader, load
+from bespin.amazon import cloudformation_yaml
+
+from tests.helpers import BespinCase
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+from textwrap import dedent
+import yaml
+import mock
+
+describe BespinCase, "Cloudformation yaml":
+    before_each:
+        self.template = dedent("""
+            Resources:
+              Queue:
+                Type: AWS::SQS::Queue
+                Properties:
+                  QueueName: !Sub "${AWS::StackName}-queue"
+            Outputs:
+              Arn:
+                Value: !GetAtt Queue.Arn
+              Name:
+                Value: !Join ["-", [!Ref "AWS::StackName", "one"]]
+            """)
+
+    it "parses intrinsic functions the same with both loaders":
+        expected = {
+              "Resources": {"Queue": {"Type": "AWS::SQS::Queue", "Properties": {"QueueName": {"Fn::Sub": "${AWS::StackName}-queue"}}}}
+            , "Outputs":
+              { "Arn": {"Value": {"Fn::GetAtt": "Queue.Arn"}}
+              , "Name": {"Value": {"Fn::Join": ["-", [{"Ref": "AWS::StackName"}, "one"]]}}
+              }
+            }
+        self.assertEqual(yaml.load(self.template, Loader=CloudformationYamlLoader), expected)
+        self.assertEqual(yaml.load(self.template, Loader=FastCloudformationYamlLoader), expected)
+
+    it "only parses the same template once":
+        with mock.patch.dict(cloudformation_yaml.parsed, {}, clear=True):
+            with mock.patch("yaml.load", wraps=yaml.load) as yaml_load:
+                first = load(self.template)
+                self.assertIs(load(self.template), first)
+                self.assertEqual(len(yaml_load.mock_calls), 1)
+
+                load(self.template + "\n")
+                self.assertEqual(len(yaml_load.mock_calls), 2)
@@ -8,6 +8,7 @@ from tests.helpers import BespinCase
 from noseOfYeti.tokeniser.support import noy_sup_setUp
 from input_algorithms.spec_base import NotSpecified
 from moto import mock_sts
+import mock
 import os
 
 # NOTE: moto uses account_id 123456789012
@@ -74,3 +75,64 @@ describe BespinCase, "Credentials":
         self.assertEquals(credentials.account_role_arn('example'), 'arn:aws:iam::123456789012:role/example')
         self.assertEquals(credentials.account_role_arn('role/role_name'), 'arn:aws:iam::123456789012:role/role_name')
         self.assertEquals(credentials.account_role_arn('arn:aws:iam::000000:role/i_know_what_im_doing'), 'arn:aws:iam::000000:role/i_know_what_im_doing')
+
+    @mock_sts
+    it "shares one stack snapshot between cloudformation objects":
+        credentials = Credentials('us-west-1', 123456789012, NotSpecified)
+        one = credentials.cloudformation("one")
+        self.assertIs(credentials.cloudformation("one"), one)
+        self.assertIs(one.snapshot, credentials.stack_snapshot)
+        self.assertIs(credentials.cloudformation("two").snapshot, one.snapshot)
+        self.assertEquals(one.snapshot.region, 'us-west-1')
+
+    describe "fingerprints":
+        before_each:
+            self.cache = mock.Mock(name="cache")
+            self.credentials = Credentials('us-west-1', 123456789012, NotSpecified, fingerprints_cache=self.cache)
+            self.cloudformation = mock.Mock(name="cloudformation", stack_name="app")
+            self.cloudformation.description.return_value = {"LastUpdatedTime": "yesterday"}
+
+        it "remembers the fingerprint with when the stack was last updated":
+            self.credentials.remember_fingerprint(self.cloudformation, "abc")
+            self.cache.set.assert_called_once_with("123456789012/us-west-1/app", {"last_updated": "yesterday", "fingerprint": "abc"})
+
+        it "only returns the fingerprint if the stack hasn't been updated since":
+            self.cache.get.return_value = {"last_updated": "yesterday", "fingerprint": "abc"}
+            self.assertEqual(self.credentials.deployed_fingerprint(self.cloudformation), "abc")
+            self.cache.get.assert_called_once_with("123456789012/us-west-1/app")
+
+            self.cache.get.return_value = {"last_updated": "last week", "fingerprint": "abc"}
+            self.assertIs(self.credentials.deployed_fingerprint(self.cloudformation), None)
+
+            self.cache.get.return_value = None
+            self.assertIs(self.credentials.deployed_fingerprint(self.cloudformation), None)
+
+        it "does nothing without a cache":
+            credentials = Credentials('us-west-1', 123456789012, NotSpecified)
+            credentials.remember_fingerprint(self.cloudformation, "abc")
+            self.assertIs(credentials.deployed_fingerprint(self.cloudformation), None)
+            self.assertEqual(len(self.cloudformation.description.mock_calls), 0)
+
+    describe "stack_outputs":
+        before_each:
+            self.cache = mock.Mock(name="cache")
+            self.credentials = Credentials('us-west-1', 123456789012, NotSpecified, outputs_cache=self.cache)
+            self.cloudformation = mock.Mock(name="cloudformation", outputs={"One": "1"})
+            self.cloudformation.description.return_value = {"LastUpdatedTime": "yesterday"}
+            self.credentials.cloudformation = mock.Mock(name="cloudformation()", return_value=self.cloudformation)
+
+        it "uses the cache without asking amazon anything":
+            self.credentials.verify_creds = mock.Mock(name="verify_creds")
+            self.cache.get.return_value = {"outputs": {"One": "cached"}}
+            self.assertEqual(self.credentials.stack_outputs("app"), {"One": "cached"})
+            self.cache.get.assert_called_once_with("123456789012/us-west-1/app", max_age=60)
+            self.assertEqual(len(self.credentials.cloudformation.mock_calls), 0)
+            self.assertEqual(len(self.credentials.verify_creds.mock_calls), 0)
+            self.assertEqual(len(self.cloudformation.mock_calls), 0)
+
+        it "gets outputs from amazon and caches them":
+            self.cache.get.return_value = None
+            self.assertEqual(self.credentials.stack_outputs("app"), {"One": "1"})
+            self.cloudformation.wait.assert_called_once_with()
+            self.cache.set.assert_called_once_with("123456789012/us-west-1/app", {"outputs": {"One": "1"}})
+
@@ -0,0 +1,53 @@
+# coding: spec
+
+from bespin.amazon.kms import KMS
+
+from tests.helpers import BespinCase
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+
+import mock
+
+describe BespinCase, "KMS":
+    before_each:
+        self.kms = KMS("us-east-1")
+        self.kms.conn = mock.Mock(name="conn")
+        self.kms.conn.decrypt.return_value = {"KeyId": "key", "Plaintext": b"hunter2"}
+
+    it "only decrypts each crypto_text and encryption context once":
+        self.assertEqual(self.kms.decrypt(b"blah", {"a": "b"})["Plaintext"], b"hunter2")
+        self.assertEqual(self.kms.decrypt(b"blah", {"a": "b"}, ["token"])["Plaintext"], b"hunter2")
+        self.assertEqual(len(self.kms.conn.decrypt.mock_calls), 1)
+
+        self.kms.decrypt(b"blah", {"a": "c"})
+        self.kms.decrypt(b"other", {"a": "b"})
+        self.assertEqual(self.kms.conn.decrypt.mock_calls
+            , [ mock.call(CiphertextBlob=b"blah", EncryptionContext={"a": "b"})
+              , mock.call(CiphertextBlob=b"blah", EncryptionContext={"a": "c"})
+              , mock.call(CiphertextBlob=b"other", EncryptionContext={"a": "b"})
+              ]
+            )
+
+    it "uses and fills the decrypt_cache":
+        decrypt_cache = mock.Mock(name="decrypt_cache")
+        decrypt_cache.get.return_value = None
+        self.kms.decrypt_cache = decrypt_cache
+        key = self.kms.decrypt_key(b"blah")
+
+        self.kms.decrypt(b"blah")
+        decrypt_cache.get.assert_called_once_with(key, max_age=3600)
+        decrypt_cache.set.assert_called_once_with(key, {"KeyId": "key", "Plaintext": "aHVudGVyMg=="})
+
+        other = KMS("us-east-1", decrypt_cache=mock.Mock(name="decrypt_cache"))
+        other.conn = mock.Mock(name="conn")
+        other.decrypt_cache.get.return_value = {"KeyId": "key", "Plaintext": "aHVudGVyMg=="}
+        self.assertEqual(other.decrypt(b"blah"), {"KeyId": "key", "Plaintext": b"hunter2"})
+        self.assertEqual(len(other.conn.decrypt.mock_calls), 0)
+
+    it "remembers decrypted values by account and assumed role":
+        key = KMS("us-east-1", account_id="123", assume_role="deployer").decrypt_key(b"blah")
+        self.assertEqual(KMS("us-east-1", account_id="123", assume_role="deployer").decrypt_key(b"blah"), key)
+        self.assertNotEqual(KMS("us-east-1", account_id="456", assume_role="deployer").decrypt_key(b"blah"), key)
+        self.assertNotEqual(KMS("us-east-1", account_id="123", assume_role="other").decrypt_key(b"blah"), key)
+        self.assertNotEqual(KMS("us-east-1", account_id="123").decrypt_key(b"blah"), key)
+        self.assertNotEqual(KMS("us-west-1", account_id="123", assume_role="deployer").decrypt_key(b"blah"), key)
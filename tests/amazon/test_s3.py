@@ -0,0 +1,71 @@
+# coding: spec
+
+from bespin.amazon.s3 import S3, MultipartUpload
+
+from tests.helpers import BespinCase
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+import botocore
+import mock
+
+describe BespinCase, "MultipartUpload":
+    before_each:
+        self.s3 = S3("us-east-1")
+        self.s3.conn = mock.Mock(name="conn")
+        self.s3.conn.create_multipart_upload.return_value = {"UploadId": "upload"}
+
+        self.bodies = {}
+        def upload_part(PartNumber, Body, **kwargs):
+            self.bodies[PartNumber] = Body
+            return {"ETag": "etag{0}".format(PartNumber)}
+        self.s3.conn.upload_part.side_effect = upload_part
+
+    it "uploads what is written in parts and completes the upload":
+        with self.s3.multipart_upload("s3://bucket/path/to/key", part_size=4, max_parallel=2) as upload:
+            upload.write(b"abcdefg")
+            upload.write(b"hijk")
+
+        self.assertEqual(self.bodies, {1: b"abcd", 2: b"efgh", 3: b"ijk"})
+        self.s3.conn.create_multipart_upload.assert_called_once_with(Bucket="bucket", Key="path/to/key")
+        self.s3.conn.complete_multipart_upload.assert_called_once_with(Bucket="bucket", Key="path/to/key", UploadId="upload"
+            , MultipartUpload={"Parts": [{"ETag": "etag1", "PartNumber": 1}, {"ETag": "etag2", "PartNumber": 2}, {"ETag": "etag3", "PartNumber": 3}]}
+            )
+        self.assertEqual(len(self.s3.conn.abort_multipart_upload.mock_calls), 0)
+
+    it "aborts the upload if a part fails":
+        error = ValueError("nope")
+        self.s3.conn.upload_part.side_effect = error
+
+        with self.fuzzyAssertRaisesError(ValueError, "nope"):
+            with MultipartUpload(self.s3, "bucket", "key", part_size=4) as upload:
+                upload.write(b"abcdefgh")
+
+        self.s3.conn.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="key", UploadId="upload")
+        self.assertEqual(len(self.s3.conn.complete_multipart_upload.mock_calls), 0)
+
+    it "aborts the upload if a part fails before the last part is sent":
+        error = ValueError("nope")
+        self.s3.conn.upload_part.side_effect = error
+
+        upload = self.s3.multipart_upload("s3://bucket/key", part_size=4, max_parallel=1)
+        upload.write(b"abcdefg")
+        upload.threads[0].join()
+
+        with self.fuzzyAssertRaisesError(ValueError, "nope"):
+            with upload:
+                pass
+        self.s3.conn.abort_multipart_upload.assert_called_once_with(Bucket="bucket", Key="key", UploadId="upload")
+
+describe BespinCase, "object_metadata":
+    before_each:
+        self.s3 = S3("us-east-1")
+        self.s3.conn = mock.Mock(name="conn")
+
+    it "returns the metadata of the object":
+        self.s3.conn.head_object.return_value = {"Metadata": {"bespin-digest": "abc"}}
+        self.assertEqual(self.s3.object_metadata("s3://bucket/path/to/key"), {"bespin-digest": "abc"})
+        self.s3.conn.head_object.assert_called_once_with(Bucket="bucket", Key="path/to/key")
+
+    it "returns None if there is no object":
+        self.s3.conn.head_object.side_effect = botocore.exceptions.ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        self.assertIs(self.s3.object_metadata("s3://bucket/path/to/key"), None)
@@ -0,0 +1,98 @@
+# coding: spec
+
+from bespin.amazon.throttling import RateLimiter, TokenBucket, is_throttle, limiter
+from bespin.errors import Throttled
+from bespin.executor import App
+
+from tests.helpers import BespinCase
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp, noy_sup_tearDown
+import boto.exception
+import botocore
+import logging
+import mock
+
+def client_error(code):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": "nope"}, "ResponseMetadata": {"HTTPStatusCode": 400}}, "DescribeStacks")
+
+describe BespinCase, "is_throttle":
+    it "knows throttling errors from boto and botocore":
+        self.assertTrue(is_throttle(client_error("Throttling")))
+        self.assertTrue(is_throttle(client_error("RequestLimitExceeded")))
+        self.assertTrue(is_throttle(boto.exception.BotoServerError(400, "Bad Request", body="<Code>Throttling</Code>")))
+        self.assertFalse(is_throttle(client_error("ValidationError")))
+        self.assertFalse(is_throttle(ValueError("Throttling")))
+
+describe BespinCase, "TokenBucket":
+    it "waits for a token once the burst is used up":
+        now = [100]
+        def sleep(amount):
+            now[0] += amount
+
+        with mock.patch("time.time", lambda: now[0]), mock.patch("time.sleep", sleep):
+            bucket = TokenBucket(rate=2, burst=2)
+            bucket.take()
+            bucket.take()
+            self.assertEqual(now[0], 100)
+            bucket.take()
+            self.assertEqual(now[0], 100.5)
+
+    it "slows down and speeds back up":
+        bucket = TokenBucket(rate=4, burst=4)
+        bucket.slow_down()
+        bucket.slow_down()
+        self.assertEqual(bucket.rate, 1)
+        for _ in range(100):
+            bucket.speed_up()
+        self.assertEqual(bucket.rate, 4)
+
+describe BespinCase, "RateLimiter":
+    before_each:
+        self.limiter = RateLimiter(rate=1000, burst=1000, attempts=3)
+        self.sleeps = []
+        self.sleep_patch = mock.patch("time.sleep", self.sleeps.append)
+        self.sleep_patch.start()
+
+    after_each:
+        self.sleep_patch.stop()
+
+    it "retries throttled calls with jittered exponential backoff and counts them":
+        func = mock.Mock(name="func", side_effect=[client_error("Throttling"), client_error("Throttling"), "result"])
+        with mock.patch("random.uniform", lambda low, high: high):
+            self.assertEqual(self.limiter.call("cloudformation", "us-east-1", func, 1, two=2), "result")
+
+        self.assertEqual(func.mock_calls, [mock.call(1, two=2)] * 3)
+        self.assertEqual(self.sleeps, [0.5, 1])
+        self.assertEqual(self.limiter.stats(), {("cloudformation", "us-east-1"): {"calls": 3, "throttles": 2, "retries": 2, "waited": 1.5}})
+
+    it "gives up after too many attempts":
+        func = mock.Mock(name="func", side_effect=client_error("Throttling"))
+        with self.fuzzyAssertRaisesError(Throttled, service="s3", region="us-east-1", attempts=3):
+            self.limiter.call("s3", "us-east-1", func)
+        self.assertEqual(len(func.mock_calls), 3)
+        self.assertEqual(len(self.sleeps), 2)
+
+    it "doesn't retry other errors":
+        error = client_error("ValidationError")
+        func = mock.Mock(name="func", side_effect=error)
+        with self.fuzzyAssertRaisesError(botocore.exceptions.ClientError):
+            self.limiter.call("s3", "us-east-1", func)
+        self.assertEqual(len(func.mock_calls), 1)
+        self.assertEqual(self.limiter.stats()[("s3", "us-east-1")]["throttles"], 0)
+
+    it "logs what happened with each service":
+        self.limiter.call("s3", "us-east-1", lambda: None)
+        with mock.patch("bespin.amazon.throttling.log") as log:
+            self.limiter.log_stats()
+        log.log.assert_called_once_with(logging.DEBUG, mock.ANY, "s3", "us-east-1", 1, 0, 0, 0)
+
+describe BespinCase, "Running a task":
+    it "logs the calls to amazon at the end":
+        collector = mock.Mock(name="collector")
+        collector.configuration = {"task_runner": mock.Mock(name="task_runner", side_effect=ValueError("nope")), "bespin": mock.Mock(name="bespin")}
+        args_obj = mock.Mock(name="args_obj")
+
+        with mock.patch("bespin.executor.Collector", lambda: collector), mock.patch.object(limiter, "log_stats") as log_stats:
+            with self.fuzzyAssertRaisesError(ValueError, "nope"):
+                App().execute(args_obj, {"bespin": {}}, [], mock.Mock(name="logging_handler"))
+        log_stats.assert_called_once_with()
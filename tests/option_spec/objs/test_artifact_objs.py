@@ -8,6 +8,7 @@ from bespin.amazon.s3 import S3
 from tests.helpers import BespinCase
 
 from noseOfYeti.tokeniser.support import noy_sup_setUp
+from input_algorithms.spec_base import NotSpecified
 from input_algorithms import spec_base as sb
 from input_algorithms.meta import Meta
 import boto3
@@ -96,6 +97,51 @@ describe BespinCase, "ArtifactCollection":
                 , sorted(["stuff/four.tar.gz"])
                 )
 
+describe BespinCase, "Artifact":
+    describe "digest":
+        before_each:
+            self.root, self.folders = self.setup_directory({"one": {"two": "2", "three": "3"}})
+
+        def make_artifact(self, paths=None, files=None, compression_type="gz", compression_threads=None, reproducible=False):
+            return Artifact(paths=paths or [], files=files or [], commands=[], upload_to="s3://bucket/artifact.tar.gz"
+                , not_created_here=False, cleanup_prefix=NotSpecified, history_length=5
+                , compression_type=compression_type, compression_level=None, compression_threads=compression_threads
+                , archive_format="tar", reproducible=reproducible, stream_upload=False
+                )
+
+        it "only changes when the inputs change":
+            paths = [ArtifactPath(self.folders["one"]["/folder/"], "/app")]
+            files = [ArtifactFile("{VERSION}", "/app/VERSION", NotSpecified, None)]
+            digest = self.make_artifact(paths, files).digest({"VERSION": "1"})
+
+            self.assertEqual(self.make_artifact(paths, files).digest({"VERSION": "1"}), digest)
+            self.assertNotEqual(self.make_artifact(paths, files).digest({"VERSION": "2"}), digest)
+            self.assertNotEqual(self.make_artifact(paths, files, compression_type="xz").digest({"VERSION": "1"}), digest)
+            self.assertNotEqual(self.make_artifact(paths, files, compression_threads=4).digest({"VERSION": "1"}), digest)
+            self.assertNotEqual(self.make_artifact(paths, files, reproducible=True).digest({"VERSION": "1"}), digest)
+
+            with open(self.folders["one"]["two"]["/file/"], "w") as fle:
+                fle.write("changed")
+            self.assertNotEqual(self.make_artifact(paths, files).digest({"VERSION": "1"}), digest)
+
+        it "changes when a file's mode or link changes":
+            paths = [ArtifactPath(self.folders["one"]["/folder/"], "/app")]
+            digest = self.make_artifact(paths).digest({})
+
+            os.chmod(self.folders["one"]["two"]["/file/"], 0o755)
+            chmodded = self.make_artifact(paths).digest({})
+            self.assertNotEqual(chmodded, digest)
+
+            os.symlink(self.folders["one"]["two"]["/file/"], os.path.join(self.folders["one"]["/folder/"], "link"))
+            linked = self.make_artifact(paths).digest({})
+            os.remove(os.path.join(self.folders["one"]["/folder/"], "link"))
+            os.symlink("two", os.path.join(self.folders["one"]["/folder/"], "link"))
+            self.assertNotEqual(self.make_artifact(paths).digest({}), linked)
+
+        it "has no digest when a file comes from a task":
+            files = [ArtifactFile(NotSpecified, "/app/VERSION", "version", mock.Mock(name="task_runner"))]
+            self.assertIs(self.make_artifact(files=files).digest({}), None)
+
 describe BespinCase, "ArtifactPath":
     describe "add_to_tar":
         it "adds everything from it's files method":
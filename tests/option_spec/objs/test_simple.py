@@ -23,7 +23,7 @@ describe BespinCase, "Dynamic Variable":
 
             stack = mock.Mock(name="stack")
             stack.stack_json = {"Outputs": {"one": 1}}
-            stack.cloudformation = mock.Mock(name="cloudformation", outputs={output: resolved})
+            stack.outputs = {output: resolved}
 
             var = objs.DynamicVariable(stack, output)
             self.assertIs(var.resolve(), resolved)
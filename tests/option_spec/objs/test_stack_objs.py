@@ -0,0 +1,130 @@
+# coding: spec
+
+from bespin.option_spec.stack_objs import Stack, ResolvedStack
+from bespin.amazon.cloudformation import UPDATE_COMPLETE, NONEXISTANT
+
+from tests.helpers import BespinCase
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+from input_algorithms.spec_base import NotSpecified
+import json
+import mock
+
+describe BespinCase, "Stack":
+    def make_stack(self, **options):
+        fields = dict((field, NotSpecified) for field in Stack.fields)
+        fields.update(name="app", key_name="app", stack_name="app-stack", stack_name_env=[], env=[], bespin=mock.Mock(name="bespin", max_parallel=1))
+        fields.update(options)
+        return Stack(**fields)
+
+    describe "replacing variables in params":
+        it "replaces variables and environment variables, resolving each variable once":
+            subnet = mock.Mock(name="subnet", spec=["resolve"])
+            subnet.resolve.return_value = "subnet-XXX_ZONE_XXX"
+            env = mock.Mock(name="env", pair=("ZONE", "a"))
+
+            stack = self.make_stack(env=[env], params_yaml={"Subnet": "XXX_SUBNET_XXX", "Other": "XXX_SUBNET_XXX", "Zone": "XXX_ZONE_XXX"})
+            stack.cloudformation = mock.Mock(name="cloudformation", params_from_dict=lambda params: sorted(params.items()))
+            stack.nested_var_items = lambda: [("subnet", subnet)]
+
+            self.assertEqual(json.loads(stack.params_json_raw_vars_replaced()), [["Other", "subnet-a"], ["Subnet", "subnet-a"], ["Zone", "a"]])
+            subnet.resolve.assert_called_once_with()
+
+    describe "parallel_lookups":
+        it "shares the cloudformation burst between the stacks deployed at the same time":
+            limiter = mock.Mock(name="limiter")
+            limiter.limits_for.return_value = (4, 8)
+            stack = self.make_stack()
+            with mock.patch("bespin.amazon.throttling.limiter", limiter):
+                self.assertEqual(stack.parallel_lookups, 8)
+                stack.bespin.max_parallel = 3
+                self.assertEqual(stack.parallel_lookups, 2)
+                stack.bespin.max_parallel = 20
+                self.assertEqual(stack.parallel_lookups, 1)
+            limiter.limits_for.assert_called_with("cloudformation")
+
+    describe "resolved":
+        it "works out each value once and only when it's asked for":
+            stack = self.make_stack(params_json=[{"ParameterKey": "Password", "ParameterValue": "XXX_PASSWORD_XXX"}], sensitive_params=["Password"])
+            password = mock.Mock(name="password", spec=["resolve"])
+            password.resolve.return_value = "hunter2"
+            stack.nested_var_items = lambda: [("password", password)]
+
+            resolved = stack.resolved
+            self.assertIs(stack.resolved, resolved)
+            self.assertEqual(len(password.resolve.mock_calls), 0)
+
+            self.assertEqual(resolved.stack_name, "app-stack")
+            self.assertEqual(resolved.params, [{"ParameterKey": "Password", "ParameterValue": "hunter2"}])
+            self.assertEqual(resolved.redacted_params, [{"ParameterKey": "Password", "ParameterValue": "<<redacted>>"}])
+            self.assertEqual(resolved.params, [{"ParameterKey": "Password", "ParameterValue": "hunter2"}])
+            password.resolve.assert_called_once_with()
+
+            stack.stack_name = "other"
+            self.assertEqual(resolved.stack_name, "app-stack")
+
+    describe "fingerprinting deployments":
+        before_each:
+            fields = dict((field, NotSpecified) for field in Stack.fields)
+            fields.update(
+                  name = "app"
+                , key_name = "app"
+                , stack_name = "app-stack"
+                , stack_name_env = []
+                , env = []
+                , tags = {"team": "awesome"}
+                , role_name = None
+                , termination_protection = False
+                , stack_json = {"Resources": {}}
+                , params_json = [{"ParameterKey": "One", "ParameterValue": "1"}]
+                , bespin = mock.Mock(name="bespin", dry_run=False, ignore_fingerprint=False, max_parallel=1)
+                )
+            self.stack = Stack(**fields)
+            self.stack.bespin.credentials.account_role_arn.return_value = None
+            self.stack.bespin.credentials.deployed_fingerprint.return_value = None
+
+            self.cloudformation = mock.Mock(name="cloudformation", tags={})
+            self.stack.cloudformation = self.cloudformation
+            self.stack.nested_vars = lambda: []
+
+        def fingerprint(self):
+            return self.stack.fingerprint(ResolvedStack(self.stack))
+
+        it "changes when anything we send to cloudformation changes":
+            fingerprint = self.fingerprint()
+            self.assertEqual(self.fingerprint(), fingerprint)
+
+            self.stack.termination_protection = True
+            self.assertNotEqual(self.fingerprint(), fingerprint)
+            self.stack.termination_protection = False
+
+            self.stack.params_json = [{"ParameterKey": "One", "ParameterValue": "2"}]
+            self.assertNotEqual(self.fingerprint(), fingerprint)
+
+        it "doesn't add the fingerprint to the tags of new stacks":
+            self.cloudformation.wait.return_value = NONEXISTANT
+            self.stack.create_or_update()
+            tags = self.cloudformation.create.mock_calls[0][1][2]
+            self.assertEqual(tags, {"team": "awesome"})
+
+        it "remembers the fingerprint with the credentials":
+            self.stack.remember_fingerprint()
+            self.stack.bespin.credentials.remember_fingerprint.assert_called_once_with(self.cloudformation, self.fingerprint())
+
+        it "doesn't update stacks whose fingerprint hasn't changed":
+            self.cloudformation.wait.return_value = UPDATE_COMPLETE
+            self.stack.bespin.credentials.deployed_fingerprint.return_value = self.fingerprint()
+            self.assertIs(self.stack.create_or_update(), False)
+            self.stack.bespin.credentials.deployed_fingerprint.assert_called_once_with(self.cloudformation)
+            self.assertEqual(len(self.cloudformation.update.mock_calls), 0)
+
+            self.stack.bespin.ignore_fingerprint = True
+            self.stack.create_or_update()
+            self.assertEqual(len(self.cloudformation.update.mock_calls), 1)
+
+        it "updates stacks with a different fingerprint":
+            self.cloudformation.wait.return_value = UPDATE_COMPLETE
+            self.stack.bespin.credentials.deployed_fingerprint.return_value = "something else"
+            self.stack.create_or_update()
+            tags = self.cloudformation.update.mock_calls[0][1][2]
+            self.assertEqual(tags, {"team": "awesome"})
@@ -0,0 +1,51 @@
+# coding: spec
+
+from bespin.actions import available_actions
+from bespin.errors import BadStack
+
+from tests.helpers import BespinCase
+
+import threading
+import mock
+
+describe BespinCase, "validate_templates":
+    it "validates the stacks at the same time and complains about all the failures":
+        lock = threading.Lock()
+        all_running = threading.Event()
+        info = {"running": 0, "most": 0}
+        def make_stack(name):
+            def validate():
+                with lock:
+                    info["running"] += 1
+                    info["most"] = max(info["most"], info["running"])
+                    if info["running"] == 4:
+                        all_running.set()
+                try:
+                    # Only finishes once every stack is being validated
+                    all_running.wait(5)
+                    if name in ("two", "four"):
+                        raise BadStack("Amazon says no", stack=name)
+                finally:
+                    with lock:
+                        info["running"] -= 1
+
+            stack = mock.Mock(name=name, key_name=name, validate_template_params=validate)
+            stack.dependencies = lambda stacks: []
+            return stack
+
+        stacks = dict((name, make_stack(name)) for name in ("one", "two", "three", "four"))
+        collector = mock.Mock(name="collector")
+        collector.configuration = {"bespin": mock.Mock(name="bespin", max_parallel=4), "stacks": stacks}
+
+        printed = []
+        with mock.patch("bespin.helpers.log"), mock.patch("sys.stdout", mock.Mock(name="stdout", write=printed.append)):
+            with self.fuzzyAssertRaisesError(BadStack, "Some stacks failed validation", failed=["four", "two"]):
+                available_actions["validate_templates"](collector, stack=None, artifact=None, tasks=None)
+
+        self.assertEqual(info["most"], 4)
+        collector.configuration["bespin"].credentials.verify_creds.assert_called_once_with()
+
+        lines = sorted(line.split() for line in "".join(printed).strip().split("\n"))
+        self.assertEqual([(line[0], line[2]) for line in lines], [("four", "FAILED"), ("one", "ok"), ("three", "ok"), ("two", "FAILED")])
+        for line in lines:
+            assert line[1].endswith("s") and float(line[1][:-1]) < 5, line
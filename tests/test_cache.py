@@ -0,0 +1,81 @@
+# coding: spec
+
+from bespin.cache import DiskCache, EncryptedDiskCache, cache_dir
+from bespin.errors import BespinError
+
+from tests.helpers import BespinCase
+
+import mock
+import time
+import os
+
+describe BespinCase, "DiskCache":
+    it "lives in the user's cache folder":
+        with mock.patch.dict(os.environ, {"XDG_CACHE_HOME": "/somewhere"}):
+            self.assertEqual(cache_dir(), "/somewhere/bespin")
+            self.assertEqual(DiskCache("outputs").location, "/somewhere/bespin/outputs.sqlite")
+
+    it "remembers json values":
+        with self.a_temp_dir() as directory:
+            cache = DiskCache("things", location=os.path.join(directory, "cache", "things.sqlite"))
+            self.assertIs(cache.get("one"), None)
+
+            cache.set("one", {"a": [1, 2]})
+            self.assertEqual(cache.get("one"), {"a": [1, 2]})
+            self.assertEqual(DiskCache("things", location=cache.location).get("one"), {"a": [1, 2]})
+
+            cache.delete("one")
+            self.assertIs(cache.get("one"), None)
+
+    it "ignores values older than max_age":
+        with self.a_temp_dir() as directory:
+            cache = DiskCache("things", location=os.path.join(directory, "things.sqlite"))
+            cache.set("one", 1)
+            self.assertEqual(cache.get("one", max_age=60), 1)
+            later = time.time() + 61
+            with mock.patch("time.time", lambda: later):
+                self.assertIs(cache.get("one", max_age=60), None)
+
+    it "forgets the least recently used values when it gets too big":
+        with self.a_temp_dir() as directory:
+            cache = DiskCache("things", max_size=25, location=os.path.join(directory, "things.sqlite"))
+            cache.set("one", "a" * 8)
+            time.sleep(0.01)
+            cache.set("two", "b" * 8)
+            time.sleep(0.01)
+            cache.get("one")
+            time.sleep(0.01)
+            cache.set("three", "c" * 8)
+
+            self.assertEqual(cache.get("one"), "a" * 8)
+            self.assertIs(cache.get("two"), None)
+            self.assertEqual(cache.get("three"), "c" * 8)
+
+    it "treats a broken cache as a miss":
+        with self.a_temp_file() as filename:
+            with open(filename, "w") as fle:
+                fle.write("not a database" * 100)
+            cache = DiskCache("things", location=filename)
+            cache.set("one", 1)
+            self.assertIs(cache.get("one"), None)
+
+describe BespinCase, "EncryptedDiskCache":
+    it "stores values encrypted with a key only we can read":
+        with self.a_temp_dir() as directory:
+            cache = EncryptedDiskCache("secrets", location=os.path.join(directory, "secrets.sqlite"))
+            cache.set("one", {"password": "hunter2"})
+            self.assertEqual(cache.get("one"), {"password": "hunter2"})
+
+            with open(cache.location, "rb") as fle:
+                self.assertNotIn(b"hunter2", fle.read())
+            self.assertEqual(os.stat(cache.key_location).st_mode & 0o777, 0o600)
+
+            os.remove(cache.key_location)
+            self.assertIs(cache.get("one"), None)
+
+    it "says which extra to install if cryptography isn't there":
+        with self.a_temp_dir() as directory:
+            cache = EncryptedDiskCache("secrets", location=os.path.join(directory, "secrets.sqlite"))
+            with mock.patch.dict("sys.modules", {"cryptography": None, "cryptography.fernet": None}):
+                with self.fuzzyAssertRaisesError(BespinError, "Need the cryptography package to cache passwords, install bespin\\[passwords\\]"):
+                    cache.set("one", {"password": "hunter2"})
@@ -0,0 +1,89 @@
+# coding: spec
+
+from bespin.compression import ParallelGzipWriter, ParallelZipFile, parallel_zip_supported, writer
+from bespin.errors import BadCompression
+from bespin.helpers import a_temp_file
+
+from tests.helpers import BespinCase
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+import zipfile
+import nose
+import gzip
+import six
+import io
+
+describe BespinCase, "ParallelGzipWriter":
+    it "writes a gzip member per block in order":
+        data = b"".join(six.int2byte(i % 256) for i in range(1000))
+        out = io.BytesIO()
+        compressed = ParallelGzipWriter(out, level=1, threads=3, block_size=64)
+        compressed.write(data[:500])
+        compressed.write(data[500:])
+        compressed.close()
+
+        self.assertEqual(out.getvalue().count(b"\x1f\x8b\x08"), 16)
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(out.getvalue())).read(), data)
+
+    it "writes a valid gzip when given nothing":
+        out = io.BytesIO()
+        ParallelGzipWriter(out, threads=2).close()
+        self.assertEqual(gzip.GzipFile(fileobj=io.BytesIO(out.getvalue())).read(), b"")
+
+describe BespinCase, "ParallelZipFile":
+    it "writes members in the order they were added":
+        if not parallel_zip_supported:
+            raise nose.SkipTest("ParallelZipFile needs python3.7 or later")
+        contents = dict(("file{0}".format(i), "blah{0}".format(i) * (i + 1) * 100) for i in range(20))
+        root, folders = self.setup_directory(contents)
+
+        with a_temp_file() as location:
+            archive = ParallelZipFile(location.name, threads=3, max_member_size=4000)
+            for i in range(20):
+                archive.add(folders["file{0}".format(i)]["/file/"], "/app/file{0}".format(i))
+            archive.close()
+
+            zfile = zipfile.ZipFile(location.name)
+            self.assertIs(zfile.testzip(), None)
+            self.assertEqual(zfile.namelist(), ["app/file{0}".format(i) for i in range(20)])
+            for i in range(20):
+                self.assertEqual(zfile.read("app/file{0}".format(i)), contents["file{0}".format(i)].encode("utf-8"))
+
+    it "deflates members bigger than max_member_size a chunk at a time with our level":
+        if not parallel_zip_supported:
+            raise nose.SkipTest("ParallelZipFile needs python3.7 or later")
+        root, folders = self.setup_directory({"small": "tiny", "big": "blah" * 10000})
+
+        def make(level):
+            with a_temp_file() as location:
+                archive = ParallelZipFile(location.name, level=level, threads=2, max_member_size=1000)
+                archive.add(folders["small"]["/file/"], "/app/small")
+                archive.add(folders["big"]["/file/"], "/app/big")
+                archive.add(folders["small"]["/file/"], "/app/small2")
+                archive.close()
+
+                zfile = zipfile.ZipFile(location.name)
+                self.assertIs(zfile.testzip(), None)
+                self.assertEqual(zfile.namelist(), ["app/small", "app/big", "app/small2"])
+                self.assertEqual(zfile.read("app/big"), b"blah" * 10000)
+                return zfile.getinfo("app/big").compress_size
+
+        self.assertGreater(make(0), 40000)
+        self.assertLess(make(9), 1000)
+
+describe BespinCase, "writer":
+    it "can compress with zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise nose.SkipTest()
+
+        out = io.BytesIO()
+        compressed = writer(out, "zstd", level=5, threads=2)
+        compressed.write(b"blah" * 1000)
+        compressed.close()
+        self.assertEqual(zstandard.ZstdDecompressor().decompressobj().decompress(out.getvalue()), b"blah" * 1000)
+
+    it "complains about unknown compression":
+        with self.fuzzyAssertRaisesError(BadCompression, "Unknown compression", compression="bz2"):
+            writer(io.BytesIO(), "bz2")
@@ -3,7 +3,10 @@
 from bespin.option_spec.bespin_specs import Bespin
 from bespin.option_spec.stack_objs import Stack, StaticVariable, Environment
 from bespin.option_spec.task_objs import Task
+from bespin.actions import default_actions
+from bespin.task_finder import TaskFinder
 from bespin.collector import Collector
+from bespin.cache import PickledDiskCache
 
 from tests.helpers import BespinCase
 
@@ -16,6 +19,7 @@ import yaml
 import uuid
 import json
 import nose
+import time
 import sys
 import os
 
@@ -72,6 +76,22 @@ describe BespinCase, "Collecting configuration":
         with self.make_collector(config, activate_converters=True) as collector:
             self.assertIs(type(collector.configuration["stacks.blah.tasks"]["a_task"]), Task)
 
+    it "only converts the tasks of the stack a task comes from":
+        config = self.make_config({"stacks": {"one": {"tasks": {"a_task": {}, "deploy": {"action": "show"}}}, "two": {"tasks": {"b_task": {}}}}})
+        with self.make_collector(config, activate_converters=True) as collector:
+            task_finder = TaskFinder(collector)
+            task_finder.find_tasks({"c_task": Task(action="show")})
+            tasks = task_finder.tasks
+            self.assertEqual(tasks.keys(), sorted(["a_task", "b_task", "c_task"] + list(default_actions)))
+            self.assertFalse(collector.configuration.converters.converted(collector.configuration.path("stacks.one.tasks")))
+
+            self.assertEqual(tasks["a_task"].stack, "one")
+            self.assertTrue(collector.configuration.converters.converted(collector.configuration.path("stacks.one.tasks")))
+            self.assertEqual(tasks["deploy"].action, "show")
+            self.assertEqual(tasks["c_task"].action, "show")
+            self.assertEqual(tasks["list_tasks"].label, "Bespin")
+            self.assertFalse(collector.configuration.converters.converted(collector.configuration.path("stacks.two.tasks")))
+
     it "sets up converters for stacks":
         config = self.make_config({"environment": "dev", "environments": {"dev": {"account_id": "123"}}, "bespin": {"environment": "dev"}, "config_root": ".", "stacks": {"blah": {"params_yaml":self.make_config({"one":"two"}), "stack_json": self.make_config({"Resources": {}}, is_json=True), "resources": []}}})
         with self.make_collector(config, activate_converters=True) as collector:
@@ -110,6 +130,27 @@ describe BespinCase, "Collecting configuration":
             self.assertEqual(stack.vars()["two"].resolve(), '2')
             self.assertEqual(stack.vars()["one"].resolve(), '2')
 
+    it "shares the configuration and environment layers between stacks":
+        stack = lambda two: {"params_yaml": self.make_config({"one": "two"}), "stack_json": self.make_config({"Resources": {}}, is_json=True), "vars": {"two": two}}
+        config = {
+              "environments": {"dev": {"account_id": "123", "vars": {"one": 1}}}
+            , "environment": "dev"
+            , "bespin": {"environment": "dev"}
+            , "config_root": "."
+            , "stacks": {"blah": stack(2), "meh": stack(3)}
+            }
+
+        with self.make_collector(self.make_config(config), activate_converters=True) as collector:
+            as_dict = mock.Mock(name="as_dict", side_effect=collector.configuration.as_dict)
+            with mock.patch.object(collector.configuration, "as_dict", as_dict):
+                blah = collector.configuration["stacks.blah"]
+                meh = collector.configuration["stacks.meh"]
+
+            as_dict.assert_called_once_with(ignore=["stacks"])
+            self.assertEqual([blah.vars()["one"].resolve(), blah.vars()["two"].resolve()], ['1', '2'])
+            self.assertEqual([meh.vars()["one"].resolve(), meh.vars()["two"].resolve()], ['1', '3'])
+            self.assertEqual(list(collector.stack_bases.values())[0][2]["vars"], {"one": 1})
+
     it "converts environments":
         config = self.make_config({"environments": {"dev": {"account_id": "1231434"}, "staging": {"account_id": 87089, "vars": {"one": "ONE"}}}})
         with self.make_collector(config, activate_converters=True) as collector:
@@ -206,3 +247,40 @@ describe BespinCase, "Collecting configuration":
 
         self.assertEqual(stack["vars"](), expected)
         self.assertEqual(stack["stack_yaml"], dedent(stack_yaml))
+
+describe BespinCase, "Reading yaml files":
+    before_each:
+        self.folder = self.make_temp_dir()
+        self.location = os.path.join(self.folder, "bespin.yml")
+        with open(self.location, "w") as fle:
+            fle.write("a: 1\nb: [2, 3]\n")
+
+    it "reads yaml without a cache":
+        self.assertEqual(Collector().read_file(self.location), {"a": 1, "b": [2, 3]})
+
+    it "only parses files again when their contents change":
+        collector = Collector()
+        collector.yaml_cache = PickledDiskCache("parsed_yaml", location=os.path.join(self.folder, "cache.sqlite"))
+
+        parse_yaml = mock.Mock(name="parse_yaml", side_effect=collector.parse_yaml)
+        with mock.patch.object(collector, "parse_yaml", parse_yaml):
+            self.assertEqual(collector.read_file(self.location), {"a": 1, "b": [2, 3]})
+            self.assertEqual(collector.read_file(self.location), {"a": 1, "b": [2, 3]})
+            self.assertEqual(len(parse_yaml.mock_calls), 1)
+
+            with open(self.location, "w") as fle:
+                fle.write("a: 4\n")
+            self.assertEqual(collector.read_file(self.location), {"a": 4})
+            self.assertEqual(len(parse_yaml.mock_calls), 2)
+
+    it "trusts the mtime of files that haven't changed for a while":
+        collector = Collector()
+        collector.yaml_cache = PickledDiskCache("parsed_yaml", location=os.path.join(self.folder, "cache.sqlite"))
+        collector.read_file(self.location)
+
+        os.utime(self.location, (time.time() - 60, time.time() - 60))
+        collector.read_file(self.location)
+
+        with mock.patch("hashlib.sha256") as sha256:
+            self.assertEqual(collector.read_file(self.location), {"a": 1, "b": [2, 3]})
+        self.assertEqual(len(sha256.mock_calls), 0)
@@ -0,0 +1,91 @@
+# coding: spec
+
+from bespin.errors import FailedStacks
+from bespin.operations.deployer import Deployer
+from bespin.amazon.cloudformation import StackSnapshot
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+from tests.helpers import BespinCase
+
+import mock
+
+describe BespinCase, "Deployer":
+    before_each:
+        self.deployer = Deployer()
+        self.snapshot = StackSnapshot("us-east-1")
+
+    def make_stack(self, name, build_first=None, build_after=None, ignore_deps=False):
+        stack = mock.Mock(name=name, key_name=name, ignore_deps=ignore_deps, notify_stackdriver=False)
+        stack.name = name
+        stack.bespin.credentials.stack_snapshot = self.snapshot
+        stack.build_after = build_after or []
+        stack.resolved = mock.Mock(name="resolved", stack_name=name, dependencies=tuple(build_first or []))
+        return stack
+
+    def make_stacks(self, **spec):
+        return dict((name, self.make_stack(name, **options)) for name, options in spec.items())
+
+    describe "deployment_graph":
+        it "has direct dependencies and build_after stacks of the wanted stacks":
+            stacks = self.make_stacks(
+                  app = {"build_first": ["db", "network"], "build_after": ["dns"]}
+                , db = {"build_first": ["network"], "build_after": ["backups"]}
+                , network = {"build_first": ["vpc"]}
+                , vpc = {}
+                , dns = {}
+                , backups = {}
+                )
+
+            graph = self.deployer.deployment_graph([stacks["app"]], stacks)
+            self.assertEqual(dict(graph)
+                , { "app": set(["db", "network"])
+                  , "db": set()
+                  , "network": set()
+                  , "dns": set(["app"])
+                  , "backups": set(["db"])
+                  }
+                )
+
+        it "doesn't include dependencies if the stack ignores them":
+            stacks = self.make_stacks(app={"build_first": ["db"], "ignore_deps": True}, db={})
+            graph = self.deployer.deployment_graph([stacks["app"]], stacks)
+            self.assertEqual(dict(graph), {"app": set()})
+
+    describe "deploy_in_parallel":
+        before_each:
+            self.stacks = self.make_stacks(
+                  app = {"build_first": ["db", "cache"]}
+                , db = {}
+                , cache = {}
+                , other = {}
+                )
+            self.made = []
+
+        def deploy(self, wanted, fail=None, max_parallel=2, **kwargs):
+            def make_stack(stack, start):
+                if stack.key_name in (fail or []):
+                    raise ValueError(stack.key_name)
+                assert self.snapshot.in_use
+                self.made.append(stack.key_name)
+
+            with mock.patch("bespin.operations.deployer.Builder"), mock.patch("bespin.helpers.log"):
+                with mock.patch.object(self.deployer, "make_stack", make_stack):
+                    self.deployer.deploy_in_parallel([self.stacks[name] for name in wanted], self.stacks, max_parallel, **kwargs)
+
+        it "makes all the stacks":
+            self.deploy(["app", "other"])
+            self.assertEqual(sorted(self.made), ["app", "cache", "db", "other"])
+            self.assertFalse(self.snapshot.in_use)
+            self.assertGreater(self.made.index("app"), self.made.index("db"))
+            self.assertGreater(self.made.index("app"), self.made.index("cache"))
+
+        it "stops after a failure":
+            with self.fuzzyAssertRaisesError(FailedStacks, failed=["db"], not_made=["app", "other"]):
+                self.deploy(["app", "other"], fail=["db"], max_parallel=1)
+            self.assertEqual(self.made, ["cache"])
+
+        it "can continue with stacks that don't need the failed stack":
+            self.stacks["after"] = self.make_stack("after", build_first=["other"])
+            with self.fuzzyAssertRaisesError(FailedStacks, failed=["db"], not_made=["app"]):
+                self.deploy(["app", "after"], fail=["db"], continue_on_error=True)
+            self.assertEqual(sorted(self.made), ["after", "cache", "other"])
@@ -1,15 +1,19 @@
 # coding: spec
 
-from bespin.helpers import a_temp_file, generate_archive_file, until, memoized_property, a_temp_directory
+from bespin.helpers import a_temp_file, generate_archive_file, until, memoized_property, a_temp_directory, run_concurrently, log_prefix, prefixed
 from bespin.option_spec.artifact_objs import ArtifactPath, ArtifactFile
+from bespin.compression import parallel_zip_supported
+from bespin.errors import BadCompression
 
 from tests.helpers import BespinCase
 
 from contextlib import contextmanager
+import threading
 import tarfile
 import zipfile
 import nose
 import mock
+import time
 import six
 import sys
 import os
@@ -144,6 +148,81 @@ describe BespinCase, "until":
         self.assertEqual(done, [1, "sleep", 1, "sleep", 1, "sleep", 1, "sleep", 1, "sleep", "break"])
         self.assertEqual(fake_time.sleep.mock_calls, [mock.call(step), mock.call(step), mock.call(step), mock.call(step), mock.call(step)])
 
+describe BespinCase, "log_prefix":
+    it "prefixes each line of text whilst in the context":
+        self.assertEqual(prefixed("one\ntwo\n"), "one\ntwo\n")
+        with log_prefix("app"):
+            self.assertEqual(prefixed("one\ntwo\n"), "[app] one\n[app] two\n")
+            with log_prefix("other"):
+                self.assertEqual(prefixed("three"), "[other] three")
+            self.assertEqual(prefixed("three"), "[app] three")
+        self.assertEqual(prefixed("three"), "three")
+
+describe BespinCase, "run_concurrently":
+    it "runs all the jobs and returns None for those that succeeded":
+        called = []
+        prefixes = []
+        def job(name):
+            def run():
+                called.append(name)
+                prefixes.append(prefixed(name))
+            return run
+
+        result = run_concurrently([(name, job(name)) for name in ("one", "two", "three")], max_parallel=2)
+        self.assertEqual(list(result.items()), [("one", None), ("two", None), ("three", None)])
+        self.assertEqual(sorted(called), ["one", "three", "two"])
+        self.assertEqual(sorted(prefixes), ["[one] one", "[three] three", "[two] two"])
+
+    it "keeps the prefix it was called with":
+        prefixes = []
+        with log_prefix("stack"):
+            run_concurrently([(name, lambda name=name: prefixes.append(prefixed(name))) for name in ("one", "two")], max_parallel=2)
+        self.assertEqual(sorted(prefixes), ["[stack:one] one", "[stack:two] two"])
+
+    it "doesn't run more than max_parallel at once":
+        lock = threading.Lock()
+        info = {"running": 0, "most": 0}
+        def job():
+            with lock:
+                info["running"] += 1
+                info["most"] = max(info["most"], info["running"])
+            time.sleep(0.05)
+            with lock:
+                info["running"] -= 1
+
+        run_concurrently([(str(i), job) for i in range(6)], max_parallel=3)
+        self.assertEqual(info["most"], 3)
+
+    it "returns errors and keeps going by default":
+        error = ValueError("nope")
+        def bad():
+            raise error
+        with mock.patch("bespin.helpers.log"):
+            result = run_concurrently([("one", bad), ("two", lambda: None)], max_parallel=1)
+        self.assertEqual(list(result.items()), [("one", error), ("two", None)])
+
+    it "logs errors unless told not to":
+        error = ValueError("nope")
+        def bad():
+            raise error
+        with mock.patch("bespin.helpers.log") as log:
+            run_concurrently([("one", bad)])
+            self.assertEqual(len(log.exception.mock_calls), 1)
+
+            result = run_concurrently([("one", bad)], log_errors=False)
+            self.assertEqual(len(log.exception.mock_calls), 1)
+        self.assertEqual(list(result.items()), [("one", error)])
+
+    it "doesn't start more jobs after a failure if stop_on_error":
+        error = ValueError("nope")
+        def bad():
+            raise error
+        called = []
+        with mock.patch("bespin.helpers.log"):
+            result = run_concurrently([("one", bad), ("two", lambda: called.append(2))], max_parallel=1, stop_on_error=True)
+        self.assertEqual(list(result.items()), [("one", error)])
+        self.assertEqual(called, [])
+
 describe BespinCase, "generate_tar_file":
     it "Creates an empty file when paths and files is empty":
         if six.PY2 and sys.version_info[1] == 6:
@@ -199,6 +278,43 @@ describe BespinCase, "generate_tar_file":
             generate_archive_file(temp_tar_file, [file1, file2], {"ONE": "one", "TWO": "two"}, compression="xz")
             self.assertTarFileContent(temp_tar_file.name, {"app/file1": "watermelon one", "app/file2": "bantwoana"}, "xz")
 
+    it "works with gz compressed across threads":
+        with a_temp_file() as temp_tar_file:
+            root, folders = self.setup_directory({"one": {"two": "blah" * 10000, "three": {"four": ""}}})
+            generate_archive_file(temp_tar_file, [ArtifactPath(root, "/app")], compression="gz", compression_level=1, compression_threads=4)
+            self.assertTarFileContent(temp_tar_file.name, {"app/one/two": "blah" * 10000, "app/one/three/four": ""}, "gz")
+
+    it "makes the same bytes from the same files when reproducible":
+        root, folders = self.setup_directory({"one": {"two": "blah", "three": {"four": ""}}})
+        os.chmod(folders["one"]["two"]["/file/"], 0o700)
+
+        def make():
+            with a_temp_file() as temp_tar_file:
+                file1 = ArtifactFile("watermelon", "/app/file1", "task", mock.Mock(name="task_runner"))
+                generate_archive_file(temp_tar_file, [ArtifactPath(root, "/app"), file1], compression="gz", reproducible=True)
+                temp_tar_file.close()
+                with open(temp_tar_file.name, "rb") as fle:
+                    made = fle.read()
+                tar = tarfile.open(temp_tar_file.name)
+                return made, [(info.name, info.mtime, info.uid, info.uname, oct(info.mode)) for info in tar.getmembers()]
+
+        made, members = make()
+        os.utime(folders["one"]["two"]["/file/"], (1000000, 1000000))
+        self.assertEqual(make()[0], made)
+        self.assertEqual(members,
+            [ ("app/one/two", 315532800, 0, "", oct(0o755))
+            , ("app/one/three/four", 315532800, 0, "", oct(0o644))
+            , ("app/file1", 315532800, 0, "", oct(0o644))
+            ]
+        )
+
+    it "can stream the tar into a file object":
+        with a_temp_file() as temp_tar_file:
+            file1 = ArtifactFile("watermelon", "/app/file1", "task", mock.Mock(name="task_runner"))
+            generate_archive_file(temp_tar_file, [file1], compression="gz", stream=True)
+            temp_tar_file.close()
+            self.assertTarFileContent(temp_tar_file.name, {"app/file1": "watermelon"}, "gz")
+
 describe BespinCase, "generate_zip_file":
     it "Creates an empty file when paths and files is empty":
         if six.PY2 and sys.version_info[1] == 6:
@@ -235,6 +351,38 @@ describe BespinCase, "generate_zip_file":
             generate_archive_file(temp_zip_file, [file1, file2], {"ONE": "one", "TWO": "two"}, archive_format="zip")
             self.assertZipFileContent(temp_zip_file.name, {"app/file1": "watermelon one", "app/file2": "bantwoana"})
 
+    it "makes the same bytes from the same files when reproducible":
+        if not parallel_zip_supported:
+            raise nose.SkipTest("ParallelZipFile needs python3.7 or later")
+        root, folders = self.setup_directory({"one": {"two": "blah", "three": {"four": ""}}})
+
+        def make():
+            with a_temp_file() as temp_zip_file:
+                file1 = ArtifactFile("watermelon", "/app/file1", "task", mock.Mock(name="task_runner"))
+                generate_archive_file(temp_zip_file, [ArtifactPath(root, "/app"), file1], archive_format="zip", reproducible=True)
+                with open(temp_zip_file.name, "rb") as fle:
+                    return fle.read()
+
+        made = make()
+        os.utime(folders["one"]["two"]["/file/"], (1000000, 1000000))
+        self.assertEqual(make(), made)
+
+    it "complains if it can't make a reproducible zip":
+        with a_temp_file() as temp_zip_file:
+            with mock.patch("bespin.compression.parallel_zip_supported", False):
+                with self.fuzzyAssertRaisesError(BadCompression, "Reproducible zip artifacts need python3.7 or later", archive_format="zip"):
+                    generate_archive_file(temp_zip_file, [], archive_format="zip", reproducible=True)
+
+    it "can deflate the files across threads":
+        if not parallel_zip_supported:
+            raise nose.SkipTest("ParallelZipFile needs python3.7 or later")
+        with a_temp_file() as temp_zip_file:
+            root, folders = self.setup_directory({"one": {"two": "blah", "three": {"four": ""}}})
+            file1 = ArtifactFile("watermelon", "/app/file1", "task", mock.Mock(name="task_runner"))
+
+            generate_archive_file(temp_zip_file, [ArtifactPath(root, "/app"), file1], archive_format="zip", compression_threads=2)
+            self.assertZipFileContent(temp_zip_file.name, {"app/one/two": "blah", "app/one/three/four": "", "app/file1": "watermelon"})
+
 
 describe BespinCase, "Memoized_property":
     it "takes in a function and sets name and cache_name":
@@ -0,0 +1,47 @@
+# coding: spec
+
+from tests.helpers import BespinCase
+
+import subprocess
+import nose
+import json
+import sys
+import os
+
+# Modules that should only be imported when a task needs them
+heavy_modules = [
+      "boto", "boto3", "botocore", "paramiko", "radssh", "pyrelic"
+    , "ultra_rest_client", "dnslib", "requests", "slacker", "cryptography"
+    ]
+
+# How long importing bespin.executor may take in seconds
+import_budget = 1.5
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+def python(*args):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.environ.get("PYTHONPATH", "")]))
+    process = subprocess.Popen([sys.executable] + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env)
+    out, err = process.communicate()
+    assert process.returncode == 0, err
+    return out.decode("utf-8"), err.decode("utf-8")
+
+describe BespinCase, "Importing bespin":
+    it "doesn't import provider sdks until a task needs them":
+        out, _ = python("-c", "import sys, json, bespin.executor; print(json.dumps(sorted(sys.modules)))")
+        imported = set(name.split(".")[0] for name in json.loads(out))
+        self.assertEqual(sorted(imported & set(heavy_modules)), [])
+
+    it "imports bespin.executor within the budget":
+        if sys.version_info < (3, 7):
+            raise nose.SkipTest("-X importtime needs python3.7 or later")
+
+        _, err = python("-X", "importtime", "-c", "import bespin.executor")
+        for line in err.splitlines():
+            parts = [part.strip() for part in line.split("|")]
+            if len(parts) == 3 and parts[2] == "bespin.executor":
+                cumulative = int(parts[1]) / 1000000.0
+                assert cumulative < import_budget, "Importing bespin.executor took {0:.2f}s".format(cumulative)
+                break
+        else:
+            assert False, "Didn't find bespin.executor in the -X importtime output"
@@ -7,6 +7,7 @@ from noseOfYeti.tokeniser.support import noy_sup_setUp, noy_sup_tearDown
 from tests.helpers import BespinCase
 import mock
 import six
+import sys
 
 if six.PY3:
     from itertools import zip_longest
@@ -64,6 +65,13 @@ describe BespinCase, "stackLayer":
             self.instance.reset()
             self.assertEqual(self.instance.accounted, {})
 
+        it "resets the layer and dependency indexes":
+            self.instance.layer_of = mock.Mock(name="layer_of")
+            self.instance.dependency_index = mock.Mock(name="dependency_index")
+            self.instance.reset()
+            self.assertEqual(self.instance.layer_of, {})
+            self.assertEqual(self.instance.dependency_index, {})
+
     describe "Getting layered":
         it "has a property for converting _layered into a list of list of tuples":
             self.instance._layered = [["one"], ["two", "three"], ["four"]]
@@ -140,6 +148,34 @@ describe BespinCase, "stackLayer":
             with self.fuzzyAssertRaisesError(StackDepCycle, chain=['stack2', 'stack1', 'stack2']):
                 self.instance.add_to_layers("stack2")
 
+        it "only asks each stack for it's dependencies once":
+            self.stack1.dependencies = mock.Mock(name="dependencies", return_value=[])
+            self.stack2.dependencies = lambda a: ["stack1"]
+            self.stack3.dependencies = lambda a: ["stack1", "stack2"]
+            self.instance.add_all_to_layers()
+            self.stack1.dependencies.assert_called_once_with(self.all_stacks)
+
+        it "doesn't hit the recursion limit with long chains of stacks":
+            count = sys.getrecursionlimit() * 2
+            all_stacks = {}
+            for i in range(count):
+                obj = mock.Mock(name="stack{0}".format(i))
+                obj.dependencies = (lambda i: lambda a: ["stack{0}".format(i - 1)] if i else [])(i)
+                all_stacks["stack{0}".format(i)] = obj
+
+            layers = Layers(["stack{0}".format(count - 1)], all_stacks)
+            layers.add_all_to_layers()
+            self.assertEqual(len(layers.layered), count)
+            self.assertEqual(layers.layered[-1], [("stack{0}".format(count - 1), all_stacks["stack{0}".format(count - 1)])])
+
+        it "complains about cycles that aren't at the start of the chain":
+            self.stack1.dependencies = lambda a: ['stack2']
+            self.stack2.dependencies = lambda a: ['stack3']
+            self.stack3.dependencies = lambda a: ['stack2']
+
+            with self.fuzzyAssertRaisesError(StackDepCycle, chain=['stack1', 'stack2', 'stack3', 'stack2']):
+                self.instance.add_to_layers("stack1")
+
         describe "Dependencies":
             before_each:
                 self.fake_add_to_layers = mock.Mock(name="add_to_layers")
@@ -190,21 +226,7 @@ describe BespinCase, "stackLayer":
                     #   \  |  /
                     #    --1--         2     6     7     8
 
-                    expected_calls = [
-                          mock.call("stack1")
-                        , mock.call("stack2")
-                        , mock.call("stack3")
-                        , mock.call("stack1", ["stack3"])
-                        , mock.call("stack4")
-                        , mock.call("stack1", ["stack4"])
-                        , mock.call("stack5")
-                        , mock.call("stack1", ["stack5"])
-                        , mock.call("stack6")
-                        , mock.call("stack7")
-                        , mock.call("stack8")
-                        , mock.call("stack9")
-                        , mock.call("stack4", ["stack9"])
-                        ]
+                    expected_calls = [mock.call("stack{0}".format(i)) for i in range(1, 10)]
 
                     expected = [
                           [("stack1", self.stack1), ("stack2", self.stack2), ("stack6", self.stack6), ("stack7", self.stack7), ("stack8", self.stack8)]
@@ -234,25 +256,7 @@ describe BespinCase, "stackLayer":
                     # |       |               |
                     # 3       5               8
 
-                    expected_calls = [
-                        mock.call("stack1")
-                        , mock.call("stack2", ["stack1"])
-                        , mock.call("stack3", ["stack1", "stack2"])
-                        , mock.call("stack4", ["stack1", "stack2"])
-                        , mock.call("stack5", ["stack1", "stack2", "stack4"])
-                        , mock.call("stack2")
-                        , mock.call("stack3")
-                        , mock.call("stack4")
-                        , mock.call("stack5")
-                        , mock.call("stack6")
-                        , mock.call("stack9", ["stack6"])
-                        , mock.call("stack4", ["stack6", "stack9"])
-                        , mock.call("stack8", ["stack6", "stack9"])
-                        , mock.call("stack7")
-                        , mock.call("stack6", ["stack7"])
-                        , mock.call("stack8")
-                        , mock.call("stack9")
-                        ]
+                    expected_calls = [mock.call("stack{0}".format(i)) for i in range(1, 10)]
 
                     expected = [
                         [("stack3", self.stack3), ("stack5", self.stack5), ("stack8", self.stack8)]
@@ -295,15 +299,7 @@ describe BespinCase, "stackLayer":
                     #         |               |
                     # 3       5               8
 
-                    expected_calls = [
-                          mock.call("stack3")
-                        , mock.call("stack4")
-                        , mock.call("stack5", ["stack4"])
-                        , mock.call("stack6")
-                        , mock.call("stack9", ["stack6"])
-                        , mock.call("stack4", ["stack6", "stack9"])
-                        , mock.call("stack8", ["stack6", "stack9"])
-                        ]
+                    expected_calls = [mock.call("stack3"), mock.call("stack4"), mock.call("stack6")]
 
                     expected = [
                           [("stack3", self.stack3), ("stack5", self.stack5), ("stack8", self.stack8)]
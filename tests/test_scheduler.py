@@ -0,0 +1,102 @@
+# coding: spec
+
+from bespin.errors import StackDepCycle
+from bespin.scheduler import Scheduler
+
+from noseOfYeti.tokeniser.support import noy_sup_setUp
+from tests.helpers import BespinCase
+
+import threading
+import mock
+import time
+
+describe BespinCase, "Scheduler":
+    before_each:
+        self.graph = {
+              "vpc": set()
+            , "network": set(["vpc"])
+            , "db": set(["network"])
+            , "app": set(["db", "network"])
+            , "dns": set(["app"])
+            , "other": set()
+            }
+
+    it "orders stacks after the stacks they need":
+        order = Scheduler(self.graph).order
+        self.assertEqual(sorted(order), sorted(self.graph))
+        for name, needs in self.graph.items():
+            for need in needs:
+                self.assertLess(order.index(need), order.index(name))
+
+    it "complains about cycles":
+        self.graph["vpc"] = set(["dns"])
+        with self.fuzzyAssertRaisesError(StackDepCycle, chain=["app", "db", "dns", "network", "vpc"]):
+            Scheduler(self.graph).order
+
+    it "knows the length of the longest chain starting with each stack":
+        self.assertEqual(Scheduler(self.graph).critical_paths
+            , {"vpc": 5, "network": 4, "db": 3, "app": 2, "dns": 1, "other": 1}
+            )
+
+    describe "running":
+        it "starts the longest chains first":
+            done = []
+            Scheduler(self.graph).run(done.append, max_parallel=1)
+            self.assertEqual(done, ["vpc", "network", "db", "app", "dns", "other"])
+
+        it "starts a stack without waiting for unrelated stacks":
+            graph = {"slow": set(), "fast": set(), "after_fast": set(["fast"])}
+            events = []
+            slow_started = threading.Event()
+            after_fast_done = threading.Event()
+            def action(name):
+                events.append(("start", name))
+                if name == "slow":
+                    slow_started.set()
+                    after_fast_done.wait(5)
+                if name == "fast":
+                    slow_started.wait(5)
+                if name == "after_fast":
+                    after_fast_done.set()
+                events.append(("end", name))
+
+            results = Scheduler(graph).run(action, max_parallel=2)
+            self.assertEqual(dict(results), {"slow": None, "fast": None, "after_fast": None})
+            self.assertLess(events.index(("end", "after_fast")), events.index(("end", "slow")))
+
+        it "doesn't run more than max_parallel at once":
+            lock = threading.Lock()
+            info = {"running": 0, "most": 0}
+            def action(name):
+                with lock:
+                    info["running"] += 1
+                    info["most"] = max(info["most"], info["running"])
+                time.sleep(0.05)
+                with lock:
+                    info["running"] -= 1
+
+            Scheduler(dict((str(i), set()) for i in range(6))).run(action, max_parallel=3)
+            self.assertEqual(info["most"], 3)
+
+        it "doesn't start stacks that need a failed stack":
+            error = ValueError("nope")
+            done = []
+            def action(name):
+                if name == "db":
+                    raise error
+                done.append(name)
+
+            with mock.patch("bespin.scheduler.log"):
+                results = Scheduler(self.graph).run(action, max_parallel=1)
+            self.assertEqual(dict(results), {"vpc": None, "network": None, "db": error, "other": None})
+            self.assertEqual(done, ["vpc", "network", "other"])
+
+        it "doesn't start anything else after a failure if stop_on_error":
+            error = ValueError("nope")
+            def action(name):
+                if name == "network":
+                    raise error
+
+            with mock.patch("bespin.scheduler.log"):
+                results = Scheduler(self.graph).run(action, max_parallel=1, stop_on_error=True)
+            self.assertEqual(list(results.items()), [("vpc", None), ("network", error)])
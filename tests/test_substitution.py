@@ -0,0 +1,64 @@
+# coding: spec
+
+from bespin.substitution import Substitution
+from bespin.errors import VariableCycle
+
+from tests.helpers import BespinCase
+
+import threading
+import mock
+
+describe BespinCase, "Substitution":
+    it "replaces placeholders and leaves unknown ones alone":
+        substitution = Substitution({"ONE": lambda: "1", "TWO_2": lambda: "2"})
+        self.assertEqual(substitution.replace("XXX_ONE_XXX XXX_TWO_2_XXX XXX_THREE_XXX XXX_ONE_XXX"), "1 2 XXX_THREE_XXX 1")
+
+    it "only gets each value once and only if it's used":
+        one = mock.Mock(name="one", return_value="1")
+        two = mock.Mock(name="two", return_value="2")
+        substitution = Substitution({"ONE": one, "TWO": two})
+        self.assertEqual(substitution.replace("XXX_ONE_XXX" * 5), "1" * 5)
+        self.assertEqual(substitution.replace("XXX_ONE_XXX"), "1")
+        one.assert_called_once_with()
+        self.assertEqual(len(two.mock_calls), 0)
+
+    it "replaces placeholders in values":
+        substitution = Substitution({"ONE": lambda: "<XXX_TWO_XXX>", "TWO": lambda: "XXX_THREE_XXX", "THREE": lambda: "3"})
+        self.assertEqual(substitution.replace("XXX_ONE_XXX XXX_TWO_XXX"), "<3> 3")
+
+    it "complains about values that need themselves":
+        substitution = Substitution({"ONE": lambda: "XXX_TWO_XXX", "TWO": lambda: "XXX_THREE_XXX", "THREE": lambda: "XXX_TWO_XXX"})
+        with self.fuzzyAssertRaisesError(VariableCycle, chain=["TWO", "THREE", "TWO"]):
+            substitution.replace("XXX_ONE_XXX")
+
+    describe "prefetch":
+        it "looks up remote values at the same time and follows values to what they need":
+            two_started = threading.Event()
+            def one():
+                # Only finds two started if they are looked up at the same time
+                assert two_started.wait(5)
+                return "XXX_LOCAL_XXX"
+            def two():
+                two_started.set()
+                return "2"
+
+            three = mock.Mock(name="three", return_value="3")
+            unused = mock.Mock(name="unused")
+            substitution = Substitution({"ONE": one, "TWO": two, "LOCAL": lambda: "XXX_THREE_XXX", "THREE": three, "UNUSED": unused})
+
+            substitution.prefetch("XXX_ONE_XXX XXX_TWO_XXX", set(["ONE", "TWO", "THREE", "UNUSED"]), max_parallel=2)
+            self.assertEqual(sorted(substitution.raw), ["LOCAL", "ONE", "THREE", "TWO"])
+            self.assertEqual(substitution.replace("XXX_ONE_XXX XXX_TWO_XXX"), "3 2")
+            three.assert_called_once_with()
+            self.assertEqual(len(unused.mock_calls), 0)
+
+        it "raises errors from looking up values without logging them":
+            error = ValueError("nope")
+            def bad():
+                raise error
+            substitution = Substitution({"ONE": bad, "TWO": lambda: "2"})
+            with mock.patch("bespin.helpers.log") as log:
+                with self.fuzzyAssertRaisesError(ValueError, "nope"):
+                    substitution.prefetch("XXX_ONE_XXX XXX_TWO_XXX", set(["ONE", "TWO"]), max_parallel=2)
+            self.assertEqual(len(log.exception.mock_calls), 0)
+            self.assertEqual(substitution.raw, {"TWO": "2"})